@@ -1,3 +1,22 @@
-from mficlient import client
+import importlib
 
-MFiClient = client.MFiClient
+# Imported on first use, so that importing one submodule (as the ``mfi``
+# tool does) does not also pull in requests and asyncio.
+_EXPORTS = {
+    "MFiClient": "mficlient.client",
+    "AsyncMFiClient": "mficlient.aio",
+    "Recorder": "mficlient.recorder",
+}
+_SUBMODULES = ("aio", "client", "recorder")
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    if name in _SUBMODULES:
+        return importlib.import_module("mficlient.%s" % name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted([*globals(), *_EXPORTS, *_SUBMODULES])
@@ -0,0 +1,232 @@
+"""
+Asyncio client for the mFi controller.
+
+Requires ``aiohttp``. The :class:`mficlient.client.Device` and
+:class:`mficlient.client.Port` objects returned here are the same ones the
+synchronous client returns; ``Port.control()`` and ``refresh()`` without
+arguments return an awaitable when the object came from an
+:class:`AsyncMFiClient`. ``Port.submit()`` needs the thread-based command
+queue of the synchronous client and is not available.
+"""
+
+import asyncio
+import json
+import time
+
+from mficlient.client import (
+    DeviceNotFound,
+    FailedToLogin,
+    MFiClient,
+    RequestFailed,
+    Topology,
+    control_payload,
+    retries_login,
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncMFiClient:
+    """
+    Asyncio counterpart of :class:`mficlient.client.MFiClient`.
+
+    Use as an async context manager, or call :meth:`login` and
+    :meth:`close` yourself::
+
+        async with AsyncMFiClient(host, user, password) as c:
+            devices = await c.get_devices()
+
+    :param session: An ``aiohttp.ClientSession`` to share one connection
+                    pool between several clients. It is not closed by
+                    :meth:`close`.
+    :param limit_per_host: Maximum number of requests this client has in
+                           flight against its controller at once.
+    """
+
+    def __init__(
+        self,
+        host,
+        username,
+        password,
+        port=None,
+        use_tls=True,
+        verify=True,
+        session=None,
+        limit_per_host=4,
+    ):
+        self._host = host
+        self._user = username
+        self._pass = password
+        self._verify = verify
+        self._session = session
+        self._own_session = session is None
+        self._limit = asyncio.Semaphore(limit_per_host)
+        self._stat_cache = None
+        self._topology = None
+        self.hooks = []
+        if use_tls:
+            port = port or 6443
+            self._baseurl = "https://%s:%i" % (host, port)
+        else:
+            port = port or 6080
+            self._baseurl = "http://%s:%i" % (host, port)
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = make_session()
+        return self._session
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    instrument = MFiClient.instrument
+    _emit = MFiClient._emit
+
+    async def _request(self, method, path, **kwargs):
+        """Make one request, returning (status, final url, body text)"""
+        session = self._get_session()
+        async with self._limit:
+            start = time.perf_counter()
+            async with session.request(
+                method, self._baseurl + path, ssl=self._verify, **kwargs
+            ) as response:
+                result = response.status, str(response.url), await response.text()
+        if self.hooks:
+            endpoint = path.rsplit("v1.0/", 1)[-1].lstrip("/") or "login"
+            self._emit("request", endpoint, time.perf_counter() - start, len(result[2]))
+        return result
+
+    async def _login(self):
+        await self._request("GET", "")
+        data = {"username": self._user, "password": self._pass, "login": "Login"}
+        status, url, _body = await self._request("POST", "/login", data=data)
+        if status == 200 and url.endswith("/manage"):
+            return
+        raise FailedToLogin("Server rejected login")
+
+    login = _login
+
+    @staticmethod
+    def _response_data(body):
+        # An expired session gets redirected to the HTML login page
+        try:
+            return json.loads(body)["data"]
+        except (ValueError, KeyError, TypeError):
+            raise RequestFailed()
+
+    @retries_login
+    async def _get_stat(self):
+        status, _url, body = await self._request("GET", "/api/v1.0/stat/device")
+        if status == 200:
+            return self._response_data(body)
+        raise RequestFailed()
+
+    @retries_login
+    async def _get_sensors(self):
+        data = {"json": json.dumps({"hello": 2})}
+        status, _url, body = await self._request(
+            "POST", "/api/v1.0/list/sensors", data=data
+        )
+        if status == 200:
+            return self._response_data(body)
+        raise RequestFailed()
+
+    get_raw_sensors = _get_sensors
+    get_raw_status = _get_stat
+
+    async def get_topology(self):
+        """Fetch ``stat/device`` and ``list/sensors`` concurrently and index them"""
+        stat, sensors = await asyncio.gather(self._get_stat(), self._get_sensors())
+        self._stat_cache = stat
+        self._topology = Topology(stat, sensors)
+        return self._topology
+
+    async def get_devices(self):
+        topology = await self.get_topology()
+        return topology.make_devices(self)
+
+    async def get_port(self, ident=None, label=None):
+        topology = await self.get_topology()
+        try:
+            portinfo = topology.port_cfg(ident=ident, label=label)
+        except DeviceNotFound:
+            return None
+        return topology.make_port(self, portinfo)
+
+    async def get_stat(self):
+        if not self._stat_cache:
+            self._stat_cache = await self._get_stat()
+        return self._stat_cache
+
+    async def refresh_port(self, port):
+        """Async replacement for ``Port.refresh()`` with no arguments"""
+        sensors = await self._get_sensors()
+        port.refresh(Topology(sensors=sensors).sensor(port.ident))
+        return port
+
+    async def refresh_device(self, device):
+        """Async replacement for ``Device.refresh()`` with no arguments"""
+        self._stat_cache = await self._get_stat()
+        device.refresh(Topology(self._stat_cache).device(ident=device.ident))
+        return device
+
+    def submit_control(self, ident, state):
+        raise TypeError(
+            "AsyncMFiClient has no command queue; await Port.control() instead"
+        )
+
+    async def _find_port(self, ident=None, device_name=None):
+        stat = await self.get_stat()
+        if self._topology is None or self._topology.stat is not stat:
+            self._topology = Topology(stat)
+        return self._topology.port_cfg(ident=ident, label=device_name)
+
+    @retries_login
+    async def _control_port(self, ident, state):
+        the_port = await self._find_port(ident=ident)
+        data = control_payload(ident, the_port, state)
+        status, _url, body = await self._request(
+            "POST", "/api/v1.0/cmd/devmgr", data=data
+        )
+        if status == 200:
+            return body
+        raise RequestFailed()
+
+
+def make_session(limit=100, limit_per_host=0):
+    """
+    Create an ``aiohttp.ClientSession`` suitable for sharing between clients.
+
+    The cookie jar accepts cookies from bare IP addresses, which is how
+    most controllers are addressed.
+    """
+    if aiohttp is None:
+        raise ImportError("AsyncMFiClient requires aiohttp")
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    return aiohttp.ClientSession(
+        connector=connector, cookie_jar=aiohttp.CookieJar(unsafe=True)
+    )
+
+
+async def gather_devices(clients):
+    """
+    Poll many controllers concurrently.
+
+    :returns: A list with the devices of each client, or the exception
+              it raised, in the same order as clients
+    """
+    return await asyncio.gather(
+        *(c.get_devices() for c in clients), return_exceptions=True
+    )
@@ -0,0 +1,267 @@
+"""
+Vectorized queries over port telemetry.
+
+Requires ``numpy``. A :class:`Snapshot` holds the readings of many ports
+as one array per field: :data:`mficlient.telemetry.NUMERIC_FIELDS` as
+floats (``nan`` where a port does not report the field) and
+:data:`mficlient.telemetry.TEXT_FIELDS` as strings (empty where missing).
+Filtering, grouping and aggregating then run over whole columns::
+
+    snap = Snapshot.from_sensors(client.get_raw_sensors())
+    snap.group_by("model").sum("active_pwr")
+    snap.where(snap["pf"] < 0.8)["label"]
+    snap.where(outliers(snap["v_rms"]))["label"]
+"""
+
+from mficlient.telemetry import NUMERIC_FIELDS, TEXT_FIELDS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _require():
+    if numpy is None:
+        raise ImportError("mficlient.analytics requires numpy")
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+class Snapshot:
+    """
+    Columns of port readings, one row per port (and per snapshot, for a
+    series).
+
+    :param columns: A dict of field name to a one dimensional array; all
+                    of the same length
+    """
+
+    def __init__(self, columns):
+        _require()
+        self.columns = {name: numpy.asarray(col) for name, col in columns.items()}
+        lengths = {len(col) for col in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Columns differ in length")
+        self._length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_sensors(cls, sensors, numeric=NUMERIC_FIELDS, text=TEXT_FIELDS):
+        """
+        Build a snapshot from ``list/sensors`` entries.
+
+        :param sensors: An iterable of sensor dicts, or of any mappings
+                        with the same keys (like ``Port.data``)
+        """
+        _require()
+        sensors = list(sensors)
+        count = len(sensors)
+        columns = {}
+        for field in numeric:
+            columns[field] = numpy.fromiter(
+                (_number(s.get(field)) for s in sensors), float, count=count
+            )
+        for field in text:
+            columns[field] = numpy.array([_text(s.get(field)) for s in sensors])
+            if not count:
+                columns[field] = columns[field].astype(str)
+        return cls(columns)
+
+    @classmethod
+    def from_devices(cls, devices, numeric=NUMERIC_FIELDS, text=TEXT_FIELDS):
+        """Build a snapshot from the ports of ``get_devices()``"""
+        return cls.from_sensors(
+            (port.data for device in devices for port in device.ports.values()),
+            numeric,
+            text,
+        )
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Build a snapshot of a :class:`mficlient.telemetry.TelemetryStore`.
+
+        The numeric columns are copied in one go from the store's typed
+        arrays, without going through a dict per port.
+        """
+        _require()
+        columns = {
+            field: numpy.array(store.column(field), dtype=float)
+            for field in NUMERIC_FIELDS
+        }
+        for field in TEXT_FIELDS:
+            columns[field] = numpy.array(
+                [_text(v) for v in store.column(field)], dtype=str
+            )
+        return cls(columns)
+
+    @classmethod
+    def concat(cls, snapshots):
+        """
+        Join a series of snapshots into one.
+
+        A ``snapshot`` column holds the position in the series each row
+        came from.
+        """
+        _require()
+        snapshots = list(snapshots)
+        if not snapshots:
+            return cls({})
+        fields = [f for f in snapshots[0].columns if f != "snapshot"]
+        columns = {
+            field: numpy.concatenate([s.columns[field] for s in snapshots])
+            for field in fields
+        }
+        columns["snapshot"] = numpy.repeat(
+            numpy.arange(len(snapshots)), [len(s) for s in snapshots]
+        )
+        return cls(columns)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    @property
+    def fields(self):
+        return list(self.columns)
+
+    def where(self, mask):
+        """The rows where mask (a boolean array) is true"""
+        mask = numpy.asarray(mask, dtype=bool)
+        return Snapshot({name: col[mask] for name, col in self.columns.items()})
+
+    def group_by(self, *fields):
+        """:returns: A :class:`Groups` keyed by the values of fields"""
+        return Groups(self, fields)
+
+
+class Groups:
+    """
+    Rows of a :class:`Snapshot` grouped by one or more fields.
+
+    The aggregates return a dict of group key (a tuple when grouping by
+    several fields) to value. ``nan`` readings are left out of them.
+    """
+
+    def __init__(self, snapshot, fields):
+        if not fields:
+            raise ValueError("Group by at least one field")
+        self.snapshot = snapshot
+        self.fields = fields
+        uniques, inverse = zip(
+            *(numpy.unique(snapshot[f], return_inverse=True) for f in reversed(fields)),
+            strict=True,
+        )
+        if len(fields) == 1:
+            codes = inverse[0].ravel()
+            self._keys = uniques[0].tolist()
+        else:
+            # Combine the codes of each field into one, most significant first
+            codes = numpy.zeros(len(snapshot), dtype=numpy.int64)
+            scale = 1
+            for values, inv in zip(uniques, inverse, strict=True):
+                codes += inv.ravel() * scale
+                scale *= len(values)
+            present, codes = numpy.unique(codes, return_inverse=True)
+            codes = codes.ravel()
+            keys = []
+            for code in present.tolist():
+                key = []
+                for values in uniques:
+                    code, index = divmod(code, len(values))
+                    key.append(values[index].item())
+                keys.append(tuple(reversed(key)))
+            self._keys = keys
+        self._codes = codes
+        self._order = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def keys(self):
+        return list(self._keys)
+
+    def _result(self, values):
+        return dict(zip(self._keys, values.tolist(), strict=True))
+
+    def _column(self, field):
+        values = self.snapshot[field]
+        return values, ~numpy.isnan(values)
+
+    def count(self, field=None):
+        """Rows per group, or rows with a reading of field"""
+        if field is None:
+            weights = None
+        else:
+            weights = self._column(field)[1]
+        counts = numpy.bincount(self._codes, weights, minlength=len(self._keys))
+        return self._result(counts.astype(numpy.int64))
+
+    def _sums(self, field):
+        values, present = self._column(field)
+        sums = numpy.bincount(
+            self._codes, numpy.where(present, values, 0.0), minlength=len(self._keys)
+        )
+        counts = numpy.bincount(self._codes, present, minlength=len(self._keys))
+        return sums, counts
+
+    def sum(self, field):
+        return self._result(self._sums(field)[0])
+
+    def mean(self, field):
+        sums, counts = self._sums(field)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            return self._result(sums / counts)
+
+    def _reduce(self, ufunc, field):
+        if self._order is None:
+            self._order = numpy.argsort(self._codes, kind="stable")
+            self._starts = numpy.searchsorted(
+                self._codes[self._order], numpy.arange(len(self._keys))
+            )
+        values = self.snapshot[field][self._order]
+        if not len(values):
+            return {}
+        return self._result(ufunc.reduceat(values, self._starts))
+
+    def min(self, field):
+        return self._reduce(numpy.fmin, field)
+
+    def max(self, field):
+        return self._reduce(numpy.fmax, field)
+
+
+def outliers(values, threshold=3.5):
+    """
+    Flag outlying readings by their modified z-score (distance from the
+    median in median absolute deviations).
+
+    :returns: A boolean array, false for ``nan`` readings
+    """
+    _require()
+    values = numpy.asarray(values, dtype=float)
+    present = ~numpy.isnan(values)
+    if not present.any():
+        return present
+    median = numpy.median(values[present])
+    deviation = numpy.abs(values - median)
+    mad = numpy.median(deviation[present])
+    if mad == 0:
+        return present & (deviation > 0)
+    with numpy.errstate(invalid="ignore"):
+        return 0.6745 * deviation / mad > threshold
@@ -0,0 +1,220 @@
+"""
+Benchmarks against a synthetic controller.
+
+Run with::
+
+    python -m mficlient.bench --devices 2500 --ports 4
+
+Every case is timed over several rounds, then run once more under
+``tracemalloc`` to record the peak memory it allocates.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from mficlient import fake
+from mficlient.client import STAT_FIELDS, RequestFailed
+from mficlient.main import Application
+
+
+class Result:
+    def __init__(self, name, times, peak, errors=0):
+        self.name = name
+        self.times = times
+        self.peak = peak
+        self.errors = errors
+
+    @property
+    def best(self):
+        return min(self.times)
+
+    @property
+    def mean(self):
+        return statistics.mean(self.times)
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "best": self.best,
+            "mean": self.mean,
+            "rounds": len(self.times),
+            "peak_bytes": self.peak,
+            "errors": self.errors,
+        }
+
+
+def measure(name, fn, rounds=5):
+    """
+    Time fn over rounds calls, then once more for peak memory.
+
+    Calls that fail with RequestFailed (see the failure injection of
+    :class:`mficlient.fake.SyntheticSession`) are timed and counted.
+    """
+    times = []
+    errors = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        try:
+            fn()
+        except RequestFailed:
+            errors += 1
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+    except RequestFailed:
+        errors += 1
+    finally:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return Result(name, times, peak, errors)
+
+
+def _cli(client, *argv):
+    app = Application()
+    app._client = client
+    options = app.parse_args(argv)
+    handler = getattr(app, "cmd_%s" % options.command)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler(options)
+
+    return run
+
+
+def cases(session):
+    """The benchmark cases as (name, callable) pairs"""
+    client = fake.FakeMFiClient(session=session)
+    streaming = fake.FakeMFiClient(
+        session=session, stream=True, stat_fields=STAT_FIELDS
+    )
+    sensors = session._sensors
+    first = sensors[0]
+    last = sensors[-1]
+    stat_body = json.dumps({"data": session._status}).encode()
+    sensors_body = json.dumps({"data": sensors}).encode()
+    state = [True]
+
+    def control_port():
+        state[0] = not state[0]
+        client._control_port(last["_id"], state[0])
+
+    return [
+        ("decode stat/device", lambda: json.loads(stat_body)),
+        ("decode list/sensors", lambda: json.loads(sensors_body)),
+        ("get_devices", client.get_devices),
+        ("get_devices (streamed)", streaming.get_devices),
+        ("iter_devices (first)", lambda: next(streaming.iter_devices())),
+        ("get_port (label)", lambda: client.get_port(label=last["label"])),
+        ("_control_port", control_port),
+        ("cli dump_sensors", _cli(client, "dump_sensors")),
+        ("cli sensors_csv", _cli(client, "sensors_csv", "--device", first["label"])),
+        ("cli raw_sensors --json", _cli(client, "raw_sensors", "--json")),
+    ]
+
+
+def run(devices, ports_per_device=4, rounds=5, latency=0, failure_rate=0, only=None):
+    session = fake.SyntheticSession(
+        devices, ports_per_device, latency=latency, failure_rate=failure_rate, seed=0
+    )
+    return [
+        measure(name, fn, rounds=rounds)
+        for name, fn in cases(session)
+        if not only or any(o in name for o in only)
+    ]
+
+
+MFI_MAIN = "from mficlient import main; main.Application().main()"
+
+
+def startup(name, argv, rounds=5, code=MFI_MAIN):
+    """
+    Time a fresh ``mfi`` process from start to exit.
+
+    The controller address is one nothing listens on, so commands that
+    talk to it measure start up to their first request.
+    """
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, MFI="http://127.0.0.1:1/")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    command = [sys.executable, "-c", code, *argv]
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, capture_output=True, check=False)
+        times.append(time.perf_counter() - start)
+    return Result(name, times, 0)
+
+
+def startup_cases(rounds=5):
+    """Start up times of the bare interpreter and of common commands"""
+    return [
+        startup("startup (python)", [], rounds, code="pass"),
+        startup("startup --help", ["--help"], rounds),
+        startup("startup raw_status", ["raw_status"], rounds),
+    ]
+
+
+def report(results, out=None):
+    out = out or sys.stdout
+    fmt = "%-26s %12s %12s %12s %7s"
+    print(fmt % ("case", "best (ms)", "mean (ms)", "peak (KiB)", "errors"), file=out)
+    print("-" * 73, file=out)
+    for result in results:
+        print(
+            fmt
+            % (
+                result.name,
+                "%.2f" % (result.best * 1000),
+                "%.2f" % (result.mean * 1000),
+                "%.0f" % (result.peak / 1024),
+                result.errors,
+            ),
+            file=out,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=2500)
+    parser.add_argument("--ports", type=int, default=4, help="Ports per device")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0, metavar="SECS")
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--only", action="append", help="Only cases matching this")
+    parser.add_argument("--json", default=False, action="store_true")
+    parser.add_argument(
+        "--startup",
+        default=False,
+        action="store_true",
+        help="Also time starting the mfi tool",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        args.devices,
+        args.ports,
+        rounds=args.rounds,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        only=args.only,
+    )
+    if args.startup:
+        results.extend(startup_cases(args.rounds))
+    if args.json:
+        print(json.dumps([r.as_dict() for r in results]))
+    else:
+        report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Queued, rate-limited port control.
+
+:class:`CommandQueue` sends control commands for one controller from a
+single worker thread, at most ``rate`` per second. A command for a port
+that is still waiting to be sent replaces the earlier one, so a relay
+flipped several times in a burst costs one round trip. Every caller gets
+a :class:`concurrent.futures.Future`; those of replaced commands resolve
+with the outcome of the command that replaced them.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+
+class CommandQueue:
+    """
+    Send control commands for one client.
+
+    :param client: A :class:`mficlient.client.MFiClient`
+    :param rate: Commands per second sent to the controller
+    :param burst: Commands that may be sent back to back after a quiet
+                  spell
+    """
+
+    def __init__(self, client, rate=5, burst=1, clock=time.monotonic, sleep=None):
+        self._client = client
+        self.rate = rate
+        self.burst = burst
+        self.sent = 0
+        self.coalesced = 0
+        self._clock = clock
+        self._sleep = sleep or time.sleep
+        self._allowance = burst
+        self._stamp = clock()
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key, state):
+        """
+        Queue a command.
+
+        :param key: The port id or label
+        :param state: The desired output state
+        :returns: A future for the controller's response
+        """
+        future = concurrent.futures.Future()
+        try:
+            ident = self._client._resolve(lambda t: t.port_ident(ident=key, label=key))
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Command queue is closed")
+            if ident in self._pending:
+                self._pending[ident][1].append(future)
+                self._pending[ident][0] = state
+                self.coalesced += 1
+            else:
+                self._pending[ident] = [state, [future]]
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def close(self, wait=True):
+        """Stop accepting commands; the queued ones are still sent"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            worker = self._worker
+        if wait and worker is not None:
+            worker.join()
+
+    def _wait_turn(self):
+        now = self._clock()
+        self._allowance = min(
+            self.burst, self._allowance + (now - self._stamp) * self.rate
+        )
+        self._stamp = now
+        if self._allowance < 1:
+            self._sleep((1 - self._allowance) / self.rate)
+            self._stamp = self._clock()
+            self._allowance = 1
+        self._allowance -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # Commands arriving while we wait can still replace queued ones
+            self._wait_turn()
+            with self._cond:
+                ident = next(iter(self._pending))
+                state, futures = self._pending.pop(ident)
+            try:
+                portinfo = self._client._find_port(ident=ident)
+                result = self._client._send_control(ident, portinfo, state)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future in futures:
+                    future.set_result(result)
+            self.sent += 1
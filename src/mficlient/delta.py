@@ -0,0 +1,106 @@
+"""Incremental change tracking over successive ``list/sensors`` payloads."""
+
+import collections
+import time
+
+from mficlient.client import Port
+
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+
+# Fields that move on every report; they are kept up to date on the
+# ports but not reported as changes by default.
+TIMESTAMP_FIELDS = ("rpt_time", "val_time", "wh_rpt_time")
+
+Change = collections.namedtuple("Change", ["kind", "port", "field", "old", "new"])
+
+
+class DeltaEngine:
+    """
+    Keep one :class:`mficlient.client.Port` per sensor and update it in place.
+
+    Each call to :meth:`update` compares a ``list/sensors`` payload with
+    the previous one by ``_id`` and returns (and hands to subscribers) a
+    :data:`Change` for every field whose value moved. New sensors produce
+    a single ``added`` change and vanished ones a ``removed`` change, both
+    with ``field`` set to ``None``. A sensor dict that is the very one
+    passed last time, as an ``incremental`` client returns for ports that
+    have not reported since, is skipped without comparing it.
+
+    :param client: The client used by :meth:`poll` and given to the ports
+    :param fields: Only report changes to these fields (default: all)
+    :param quiet: Fields that are updated but never reported
+    """
+
+    def __init__(self, client, fields=None, quiet=TIMESTAMP_FIELDS):
+        self._client = client
+        self._fields = set(fields) if fields else None
+        self._quiet = set(quiet or ())
+        self._ports = {}
+        self._seen = {}
+        self._subscribers = []
+
+    @property
+    def ports(self):
+        return self._ports
+
+    def subscribe(self, callback):
+        """Call callback(change) for every change found by :meth:`update`"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _reported(self, key):
+        if key in self._quiet:
+            return False
+        return self._fields is None or key in self._fields
+
+    def update(self, sensors):
+        changes = []
+        seen = set()
+        for sensor in sensors:
+            ident = sensor["_id"]
+            seen.add(ident)
+            if self._seen.get(ident) is sensor:
+                continue
+            self._seen[ident] = sensor
+            port = self._ports.get(ident)
+            if port is None:
+                port = self._ports[ident] = Port(self._client, ident)
+                port.refresh(sensor)
+                changes.append(Change(ADDED, port, None, None, None))
+                continue
+
+            current = port.data
+            updates = {}
+            for key, value in sensor.items():
+                old = current.get(key)
+                if old != value or key not in current:
+                    updates[key] = value
+                    if self._reported(key):
+                        changes.append(Change(CHANGED, port, key, old, value))
+            if updates:
+                port.refresh(updates)
+
+        for ident in [ident for ident in self._ports if ident not in seen]:
+            port = self._ports.pop(ident)
+            self._seen.pop(ident, None)
+            changes.append(Change(REMOVED, port, None, None, None))
+
+        for callback in self._subscribers:
+            for change in changes:
+                callback(change)
+        return changes
+
+    def poll(self):
+        """Fetch ``list/sensors`` from the client and :meth:`update`"""
+        return self.update(self._client.get_topology(stat=False).sensors)
+
+    def watch(self, interval):
+        """Poll forever, yielding changes as they are found"""
+        while True:
+            yield from self.poll()
+            time.sleep(interval)
@@ -0,0 +1,284 @@
+"""
+Running energy totals per port and per device.
+
+:class:`EnergyLedger` is fed each poll of ``list/sensors`` and keeps the
+energy used in every hour, day and month, per port and per device (by
+MAC address), without going back over earlier readings.
+
+A port's meter reading is ``energy_sum``, the watt hours counted since
+the meter was last reset (``wattHours - wattHoursBase`` where the
+controller does not report it). The energy used between two polls is the
+difference of their readings. When ``wattHoursBase`` changes, or the
+reading goes backwards because the device restarted, the meter started
+again from zero, so the whole new reading counts. Energy used over a gap
+between polls is spread evenly over the hours the gap covers.
+
+Totals are kept in watt hours, and can be saved to and loaded from a JSON
+file so separate runs add up. Between full saves, :meth:`EnergyLedger.flush`
+only appends the new readings to a journal next to that file, which is
+replayed on load.
+"""
+
+import datetime
+import json
+import os
+import tempfile
+import time
+
+PERIODS = ("hour", "day", "month")
+
+PORT = "port"
+DEVICE = "device"
+
+# How many of the most recent buckets of each period are kept
+RETENTION = {"hour": 24 * 62, "day": 366 * 2, "month": None}
+
+_FORMATS = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d", "month": "%Y-%m"}
+
+# Readings the journal holds before flush() folds it into a full save
+COMPACT_EVERY = 10000
+
+
+def reading(sensor):
+    """
+    Work out a port's meter reading.
+
+    :returns: A tuple like (watt hours, ``wattHoursBase``), or None when
+              the port has no energy meter
+    """
+    base = sensor.get("wattHoursBase")
+    value = sensor.get("energy_sum")
+    if value is None:
+        total = sensor.get("wattHours")
+        if total is None:
+            return None
+        value = total - (base or 0)
+    return float(value), base
+
+
+class EnergyLedger:
+    """
+    Energy used per port and device, by hour, day and month.
+
+    :param path: JSON file the totals are loaded from and saved to
+    :param tz: Time zone the periods start in (default: local time)
+    :param compact_every: Readings the journal holds before :meth:`flush`
+                          saves the totals in full instead
+    """
+
+    def __init__(self, path=None, tz=None, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.tz = tz
+        self.compact_every = compact_every
+        self.resets = 0
+        self._last = {}
+        self._ports = {}
+        self._totals = {period: {} for period in PERIODS}
+        # Readings added since the last flush(), and how many are journalled
+        self._unflushed = []
+        self._journalled = 0
+        if path is not None:
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._load(json.load(f))
+            if os.path.exists(self.journal_path):
+                self._replay(self.journal_path)
+
+    @property
+    def journal_path(self):
+        return None if self.path is None else self.path + ".journal"
+
+    def _load(self, state):
+        self.resets = state.get("resets", 0)
+        self._last = {k: tuple(v) for k, v in state["last"].items()}
+        self._ports = state["ports"]
+        for period in PERIODS:
+            totals = self._totals[period]
+            for kind, key, bucket, wh in state["totals"][period]:
+                totals.setdefault((kind, key), {})[bucket] = wh
+
+    def _replay(self, path):
+        # Readings already in the saved totals (when a save was cut short
+        # before the journal was removed) are skipped as stale
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn by a crash; save in full at the next flush()
+                    self._journalled = self.compact_every
+                    continue
+                self._account(*entry)
+                self._journalled += 1
+
+    def flush(self):
+        """
+        Keep the readings added since the last call for later runs.
+
+        They are appended to :attr:`journal_path`, until it holds
+        ``compact_every`` readings and the totals are saved in full.
+        """
+        if self._journalled + len(self._unflushed) >= self.compact_every:
+            self.save()
+            return
+        if not self._unflushed:
+            return
+        with open(self.journal_path, "a") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in self._unflushed)
+        self._journalled += len(self._unflushed)
+        self._unflushed = []
+
+    def save(self, path=None):
+        """Write out the totals in full, replacing the journal"""
+        path = path or self.path
+        state = {
+            "resets": self.resets,
+            "last": self._last,
+            "ports": self._ports,
+            "totals": {
+                period: [
+                    [kind, key, bucket, wh]
+                    for (kind, key), buckets in self._totals[period].items()
+                    for bucket, wh in buckets.items()
+                ]
+                for period in PERIODS
+            },
+        }
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), prefix=".energy-"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if path == self.path:
+            self._unflushed = []
+            self._journalled = 0
+            if os.path.exists(self.journal_path):
+                os.unlink(self.journal_path)
+
+    def _buckets(self, stamp):
+        when = datetime.datetime.fromtimestamp(stamp, self.tz)
+        return [when.strftime(_FORMATS[period]) for period in PERIODS]
+
+    def _next_hour(self, stamp):
+        when = datetime.datetime.fromtimestamp(stamp, self.tz)
+        start = when.replace(minute=0, second=0, microsecond=0)
+        return (start + datetime.timedelta(hours=1)).timestamp()
+
+    def _credit(self, keys, stamp, wh):
+        for period, bucket in zip(PERIODS, self._buckets(stamp), strict=True):
+            totals = self._totals[period]
+            for key in keys:
+                buckets = totals.setdefault(key, {})
+                if bucket not in buckets:
+                    self._expire(period, buckets)
+                buckets[bucket] = buckets.get(bucket, 0.0) + wh
+
+    def _expire(self, period, buckets):
+        keep = RETENTION[period]
+        if keep is not None and len(buckets) >= keep:
+            # Buckets are created in time order
+            del buckets[next(iter(buckets))]
+
+    def _spread(self, keys, start, end, wh):
+        if end <= start:
+            self._credit(keys, end, wh)
+            return
+        span = end - start
+        while start < end:
+            stop = min(self._next_hour(start), end)
+            self._credit(keys, start, wh * (stop - start) / span)
+            start = stop
+
+    def add(self, sensors, now=None):
+        """
+        Account for one poll.
+
+        The time of a reading is its ``wh_rpt_time`` or ``rpt_time``; a
+        reading whose time has not moved on is skipped. The first reading
+        of a port only sets where its meter stands.
+
+        :param now: The time of readings without a report time (default:
+                    the current time)
+        :returns: The number of readings accounted for
+        """
+        now = time.time() if now is None else now
+        count = 0
+        for sensor in sensors:
+            meter = reading(sensor)
+            if meter is None:
+                continue
+            value, base = meter
+            stamp = sensor.get("wh_rpt_time") or sensor.get("rpt_time")
+            stamp = now if stamp is None else stamp / 1000
+            entry = (
+                sensor["_id"],
+                sensor.get("label"),
+                sensor.get("mac"),
+                stamp,
+                value,
+                base,
+            )
+            counted = self._account(*entry)
+            if counted is None:
+                continue
+            if self.path is not None:
+                self._unflushed.append(entry)
+            if counted:
+                count += 1
+        return count
+
+    def _account(self, ident, label, mac, stamp, value, base):
+        """
+        :returns: None for a stale reading, else whether energy was
+                  accounted for
+        """
+        self._ports[ident] = [label, mac]
+        last = self._last.get(ident)
+        if last is not None and stamp <= last[0]:
+            return None
+        self._last[ident] = (stamp, value, base)
+        if last is None:
+            return False
+        last_stamp, last_value, last_base = last
+        if base != last_base or value < last_value:
+            self.resets += 1
+            used = value
+        else:
+            used = value - last_value
+        keys = [(PORT, ident)]
+        if mac:
+            keys.append((DEVICE, mac))
+        self._spread(keys, last_stamp, stamp, used)
+        return True
+
+    def label(self, ident):
+        """The last label seen for a port id"""
+        return self._ports.get(ident, [None, None])[0]
+
+    def totals(self, period="day", kind=PORT):
+        """
+        :param period: One of :data:`PERIODS`
+        :param kind: :data:`PORT` or :data:`DEVICE`
+        :returns: A dict of port id or MAC address to a dict of bucket
+                  (like ``2024-05-01`` for days) to watt hours
+        """
+        if period not in PERIODS:
+            raise ValueError("Unknown period `%s'" % period)
+        return {
+            key: dict(buckets)
+            for (k, key), buckets in self._totals[period].items()
+            if k == kind
+        }
+
+    def total(self, period, bucket, kind=PORT, key=None):
+        """Watt hours used in one bucket by one port or device, or by all"""
+        return sum(
+            buckets.get(bucket, 0.0)
+            for (k, name), buckets in self._totals[period].items()
+            if k == kind and (key is None or name == key)
+        )
@@ -0,0 +1,145 @@
+"""
+Bulk export of the latest readings of many ports.
+
+Every format uses the same columns, :data:`FIELDS`, in the same order;
+fields a port does not report are empty (CSV), ``null`` (JSON Lines) or
+missing (columnar). Rows are written as they are produced.
+
+The ``columnar`` format is a compact binary stream::
+
+    magic | uint32 header length | header JSON {"fields": [...], "types": [...]}
+    then row groups of: uint32 row count | one column block per field
+    and a row count of 0 at the end
+
+A numeric (``d``) column block is one little-endian double per row, with
+NaN for missing values. A text (``s``) column block is a uint32 length
+followed by a JSON array of the values. :func:`read_columnar` reads it.
+"""
+
+import array
+import csv
+import itertools
+import json
+import math
+import struct
+import sys
+
+from mficlient.telemetry import NUMERIC_FIELDS, TEXT_FIELDS
+
+FIELDS = TEXT_FIELDS + NUMERIC_FIELDS
+
+FORMATS = ("csv", "jsonl", "columnar")
+
+MAGIC = b"MFICOL1\0"
+GROUP_ROWS = 4096
+
+_LENGTH = struct.Struct("<I")
+
+
+def select(sensors, ports):
+    """Keep the sensors whose label or id is in ports"""
+    ports = set(ports)
+    return (s for s in sensors if s.get("label") in ports or s["_id"] in ports)
+
+
+def write_csv(sensors, out, fields=FIELDS):
+    writer = csv.writer(out)
+    writer.writerow(fields)
+    count = 0
+    for sensor in sensors:
+        writer.writerow([sensor.get(f) for f in fields])
+        count += 1
+    return count
+
+
+def write_jsonl(sensors, out, fields=FIELDS):
+    count = 0
+    for sensor in sensors:
+        out.write(json.dumps({f: sensor.get(f) for f in fields}))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def write_columnar(sensors, out, fields=FIELDS):
+    types = ["d" if f in NUMERIC_FIELDS else "s" for f in fields]
+    header = json.dumps({"fields": list(fields), "types": types}).encode()
+    out.write(MAGIC + _LENGTH.pack(len(header)) + header)
+    count = 0
+    sensors = iter(sensors)
+    while True:
+        group = list(itertools.islice(sensors, GROUP_ROWS))
+        out.write(_LENGTH.pack(len(group)))
+        if not group:
+            return count
+        count += len(group)
+        for field, kind in zip(fields, types, strict=True):
+            if kind == "d":
+                column = array.array("d", (_number(s.get(field)) for s in group))
+                if sys.byteorder != "little":
+                    column.byteswap()
+                out.write(column.tobytes())
+            else:
+                block = json.dumps([s.get(field) for s in group]).encode()
+                out.write(_LENGTH.pack(len(block)) + block)
+
+
+def _read(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated columnar stream")
+    return data
+
+
+def read_columnar(f):
+    """
+    Read a stream written by :func:`write_columnar`.
+
+    :returns: A tuple like (fields, groups), where groups yields a dict of
+              field to list of values for each row group
+    """
+    if _read(f, len(MAGIC)) != MAGIC:
+        raise ValueError("Not a columnar export")
+    (length,) = _LENGTH.unpack(_read(f, _LENGTH.size))
+    header = json.loads(_read(f, length))
+    fields = header["fields"]
+
+    def groups():
+        while True:
+            (rows,) = _LENGTH.unpack(_read(f, _LENGTH.size))
+            if not rows:
+                return
+            group = {}
+            for field, kind in zip(fields, header["types"], strict=True):
+                if kind == "d":
+                    column = array.array("d")
+                    column.frombytes(_read(f, rows * 8))
+                    if sys.byteorder != "little":
+                        column.byteswap()
+                    group[field] = column.tolist()
+                else:
+                    (length,) = _LENGTH.unpack(_read(f, _LENGTH.size))
+                    group[field] = json.loads(_read(f, length))
+            yield group
+
+    return fields, groups()
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+def export(sensors, out, fmt="csv", fields=FIELDS):
+    """
+    Write sensors to out in one of :data:`FORMATS`.
+
+    :param out: A text file, or a binary one for ``columnar``
+    :returns: The number of rows written
+    """
+    return WRITERS[fmt](sensors, out, fields)
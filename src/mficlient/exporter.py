@@ -0,0 +1,183 @@
+"""
+Prometheus text exposition of ``list/sensors`` data.
+
+:class:`MetricsRenderer` keeps the rendered sample lines of every port and
+only re-renders a port when one of its exported values or labels changed,
+so the cost of a scrape is dominated by joining strings.
+"""
+
+import http.server
+import math
+import threading
+import time
+
+from mficlient.client import DeviceNotFound
+from mficlient.server import ThreadingHTTPServer
+
+# (sensor field, metric name, type, help)
+METRICS = (
+    ("active_pwr", "mfi_active_power_watts", "gauge", "Active power"),
+    ("v_rms", "mfi_voltage_rms_volts", "gauge", "RMS voltage"),
+    ("i_rms", "mfi_current_rms_amps", "gauge", "RMS current"),
+    ("pf", "mfi_power_factor", "gauge", "Power factor"),
+    ("energy_sum", "mfi_energy_watt_hours_total", "counter", "Energy used"),
+    ("output", "mfi_output", "gauge", "Output relay state"),
+    ("val", "mfi_sensor_value", "gauge", "Value of the port's primary tag"),
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value))
+
+
+class MetricsRenderer:
+    """
+    Incrementally render port metrics.
+
+    Call :meth:`update` with each new :class:`mficlient.client.Topology`
+    and :meth:`render` to get the exposition text.
+    """
+
+    def __init__(self, metrics=METRICS):
+        self._metrics = metrics
+        self._fields = tuple(field for field, _n, _t, _h in metrics)
+        self._state = {}
+        self._lines = {name: {} for _f, name, _t, _h in metrics}
+        self._text = None
+        self.rendered = 0
+
+    def _label_values(self, topology, sensor):
+        try:
+            mac = topology.port_device(sensor["_id"]).get("mac", "")
+        except DeviceNotFound:
+            mac = ""
+        return (
+            sensor.get("label", ""),
+            sensor.get("model", ""),
+            mac,
+            sensor.get("tag", ""),
+            sensor["_id"],
+        )
+
+    def _labels(self, label_values):
+        return '{label="%s",model="%s",mac="%s",tag="%s",id="%s"}' % tuple(
+            _escape(value) for value in label_values
+        )
+
+    def _render_port(self, ident, labels, values):
+        for (_field, name, _t, _h), value in zip(self._metrics, values, strict=True):
+            lines = self._lines[name]
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                lines.pop(ident, None)
+            else:
+                lines[ident] = "%s%s %s" % (name, labels, _format_value(value))
+        self.rendered += 1
+
+    def update(self, topology):
+        """Re-render the ports whose values or labels changed; returns how many did"""
+        changed = 0
+        seen = set()
+        for sensor in topology.sensors:
+            ident = sensor["_id"]
+            seen.add(ident)
+            values = tuple(sensor.get(field) for field in self._fields)
+            label_values = self._label_values(topology, sensor)
+            state = self._state.get(ident)
+            if state is not None and state == (values, label_values):
+                continue
+            self._state[ident] = (values, label_values)
+            self._render_port(ident, self._labels(label_values), values)
+            changed += 1
+
+        for ident in [ident for ident in self._state if ident not in seen]:
+            del self._state[ident]
+            for lines in self._lines.values():
+                lines.pop(ident, None)
+            changed += 1
+
+        if changed:
+            self._text = None
+        return changed
+
+    def render(self):
+        if self._text is None:
+            blocks = []
+            for _field, name, kind, help_ in self._metrics:
+                lines = self._lines[name]
+                if not lines:
+                    continue
+                blocks.append(
+                    "# HELP %s %s\n# TYPE %s %s\n" % (name, help_, name, kind)
+                )
+                blocks.append("\n".join(lines.values()))
+                blocks.append("\n")
+            self._text = "".join(blocks)
+        return self._text
+
+
+class Exporter:
+    """
+    Serve ``/metrics`` for one client, polling the controller per scrape.
+
+    :param stat_interval: Seconds to cache ``stat/device`` between scrapes
+    """
+
+    def __init__(self, client, stat_interval=300):
+        self._client = client
+        client.cache.ttls["stat"] = stat_interval
+        self.renderer = MetricsRenderer()
+        self._lock = threading.Lock()
+
+    def scrape(self):
+        with self._lock:
+            start = time.monotonic()
+            self.renderer.update(self._client.get_topology())
+            duration = time.monotonic() - start
+            text = self.renderer.render()
+        return text + (
+            "# HELP mfi_scrape_duration_seconds Time spent polling the controller\n"
+            "# TYPE mfi_scrape_duration_seconds gauge\n"
+            "mfi_scrape_duration_seconds %s\n" % repr(duration)
+        )
+
+    def make_server(self, address):
+        host, port = address.rsplit(":", 1)
+        handler = type("Handler", (MetricsHandler,), {"exporter": self})
+        return ThreadingHTTPServer((host, int(port)), handler)
+
+    def serve(self, address):
+        server = self.make_server(address)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    exporter = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = self.exporter.scrape().encode()
+        except Exception as e:
+            self.send_error(502, explain=repr(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -1,9 +1,15 @@
+import collections
 import json
+import random
+import time
+import zlib
 
-from mficlient import client, fake_data
+from mficlient import aio, client, fake_data
 
 
 class FakeResponse:
+    headers = {}
+
     def __init__(self, code, data):
         self.status_code = code
         self._data = data
@@ -15,43 +21,316 @@ class FakeResponse:
     def text(self):
         return self._data
 
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode()
+
+    def iter_content(self, chunk_size=1):
+        body = self.content
+        for i in range(0, len(body), chunk_size):
+            yield body[i : i + chunk_size]
+
+
+def _device_padding():
+    """The fields of a real stat/device entry that we do not generate"""
+    template = json.loads(fake_data.FAKE_STATUS)[0]
+    for key in ("_id", "mac", "ip", "model", "name", "port_cfg", "last_info"):
+        template.pop(key, None)
+    return template
+
+
+SENSOR_PADDING = {
+    "fovradius": 10,
+    "fovrotation": 0,
+    "fovangle": 1.5707963267948966,
+    "map_id": "560005309e11c18115baf2a5",
+    "x": 564.8839694656489,
+    "y": 222.18320610687024,
+}
+
+
+def make_controller(devices, ports_per_device=3, realistic=False):
+    """
+    Generate a synthetic controller state.
+
+    :param devices: Number of mPower/mPort devices
+    :param ports_per_device: Number of configured ports on each device
+    :param realistic: Include the radio, VAP and map fields real
+                      controllers send, so payload sizes match
+    :returns: A tuple like (status, sensors) shaped like the payloads of
+              ``stat/device`` and ``list/sensors``
+    """
+    status = []
+    sensors = []
+    device_padding = _device_padding() if realistic else {}
+    sensor_padding = SENSOR_PADDING if realistic else {}
+    for d in range(devices):
+        mac = "04:18:d6:%02x:%02x:%02x" % (d >> 16 & 0xFF, d >> 8 & 0xFF, d & 0xFF)
+        port_cfg = []
+        for p in range(1, ports_per_device + 1):
+            ident = "%016x%08x" % (d, p)
+            label = "Outlet %i-%i" % (d, p)
+            port_cfg.append(
+                {
+                    "port": str(p),
+                    "mac": mac,
+                    "_id": ident,
+                    "model": "Outlet",
+                    "label": label,
+                }
+            )
+            sensors.append(
+                {
+                    **sensor_padding,
+                    "_id": ident,
+                    "label": label,
+                    "mac": mac,
+                    "model": "Outlet",
+                    "port": str(p),
+                    "tag": "active_pwr",
+                    "val": float(p),
+                    "active_pwr": float(p),
+                    "energy_sum": 1000.0 + d,
+                    "wattHours": 1000.0 + d,
+                    "wattHoursBase": 0.0,
+                    "i_rms": 0.07,
+                    "v_rms": 120.5,
+                    "pf": 0.68,
+                    "output": 1.0,
+                    "output_val": 1.0,
+                    "reported_val": 1.0,
+                    "locked": False,
+                    "rpt_time": 1454972882309,
+                    "wh_rpt_time": 1454972882300,
+                    "val_time": 1454972880000,
+                }
+            )
+        status.append(
+            {
+                **json.loads(json.dumps(device_padding)),
+                "_id": "%024x" % d,
+                "mac": mac,
+                "ip": "10.%i.%i.%i" % (d >> 16 & 0xFF, d >> 8 & 0xFF, d & 0xFF),
+                "model": "P%iU" % ports_per_device,
+                "name": "mPower %i" % d,
+                "last_info": "2016-02-08T23:04:13Z",
+                "port_cfg": port_cfg,
+            }
+        )
+    return status, sensors
+
 
 class FakeSession:
-    def __init__(self):
-        self._status = json.loads(fake_data.FAKE_STATUS)
-        self._sensors = json.loads(fake_data.FAKE_SENSORS)
+    def __init__(self, status=None, sensors=None):
+        if status is None:
+            status = json.loads(fake_data.FAKE_STATUS)
+        if sensors is None:
+            sensors = json.loads(fake_data.FAKE_SENSORS)
+        self._status = status
+        self._sensors = sensors
 
-    def get(self, url, headers=None, verify=True):
+    def get(
+        self, url, headers=None, verify=True, params=None, stream=False, timeout=None
+    ):
         if url.endswith("stat/device"):
             return FakeResponse(200, self._status)
         elif url.endswith("list/sensors"):
             return FakeResponse(200, self._sensors)
+        elif url.endswith("data/m2mgeneric_by_id"):
+            return FakeResponse(200, self._trend(params))
         else:
             raise Exception("Unsupported fake path %s" % url)
 
+    def _trend(self, params):
+        """One sample per minute per tag, valued at the minute number"""
+        start = params["startTime"] // 60000 + 1
+        end = params["endTime"] // 60000 + 1
+        tags = params["tags"].split(",")
+        return [
+            {
+                "%s.0" % tag: [
+                    [minute * 60000, float(minute % 60)] for minute in range(start, end)
+                ]
+                for tag in tags
+            }
+            for _ident in params["ids"].split(",")
+        ]
+
     def _do_device(self, data):
         cmd = json.loads(data["json"])
         updates = dict(cmd)
         ident = updates.pop("sId")
+        sensors = []
         for sensor in self._sensors:
+            # Replace rather than change what earlier responses returned
+            sensor = dict(sensor)
             if sensor["_id"] == ident:
                 sensor.update(updates)
             sensor["output"] = float(sensor["val"] > 0)
+            sensors.append(sensor)
+        self._sensors = sensors
         return FakeResponse(200, self._sensors)
 
-    def post(self, url, data=None, headers=None, verify=True):
+    def post(
+        self, url, data=None, headers=None, verify=True, stream=False, timeout=None
+    ):
         if url.endswith("list/sensors"):
             return FakeResponse(200, self._sensors)
         elif url.endswith("cmd/devmgr"):
             return self._do_device(data)
 
 
+class EncodedResponse(FakeResponse):
+    """A response carrying a JSON body, so decoding costs what it really does"""
+
+    def __init__(self, code, body):
+        super().__init__(code, None)
+        self._body = body
+
+    @property
+    def content(self):
+        return self._body
+
+    def json(self):
+        return json.loads(self._body)
+
+    @property
+    def text(self):
+        return self._body.decode()
+
+
+class SyntheticSession(FakeSession):
+    """
+    A scalable fake controller.
+
+    :param devices: Number of devices to generate
+    :param ports_per_device: Number of ports on each device
+    :param latency: Seconds to sleep on every request
+    :param failure_rate: Probability (0-1) that a request fails with a
+                         500 response
+    :param seed: Seed for the failure injection
+    """
+
+    def __init__(
+        self, devices, ports_per_device=3, latency=0, failure_rate=0, seed=None
+    ):
+        status, sensors = make_controller(devices, ports_per_device, realistic=True)
+        super().__init__(status, sensors)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = collections.Counter()
+        self.failures = 0
+        self._random = random.Random(seed)  # noqa: S311
+        self._encoded = {}
+
+    def _encode(self, key, data, headers=None):
+        # Sensors change on every command, so they are re-encoded then
+        if key not in self._encoded:
+            self._encoded[key] = json.dumps({"data": data}).encode()
+        body = self._encoded[key]
+        etag = '"%08x"' % zlib.crc32(body)
+        if headers and headers.get("If-None-Match") == etag:
+            return FakeResponse(304, None)
+        response = EncodedResponse(200, body)
+        response.headers = {"ETag": etag}
+        return response
+
+    def _inject(self, url):
+        self.requests[url.rsplit("/", 1)[-1]] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            return FakeResponse(500, None)
+        return None
+
+    def get(
+        self, url, headers=None, verify=True, params=None, stream=False, timeout=None
+    ):
+        failure = self._inject(url)
+        if failure:
+            return failure
+        if url.endswith("stat/device"):
+            return self._encode("stat", self._status, headers)
+        elif url.endswith("list/sensors"):
+            return self._encode("sensors", self._sensors)
+        return super().get(
+            url, headers=headers, verify=verify, params=params, timeout=timeout
+        )
+
+    def _do_device(self, data):
+        cmd = json.loads(data["json"])
+        for sensor in self._sensors:
+            if sensor["_id"] == cmd["sId"]:
+                sensor["val"] = cmd["val"]
+                sensor["output"] = float(cmd["val"] > 0)
+        self._encoded.pop("sensors", None)
+        return FakeResponse(200, "{}")
+
+    def post(
+        self, url, data=None, headers=None, verify=True, stream=False, timeout=None
+    ):
+        failure = self._inject(url)
+        if failure:
+            return failure
+        if url.endswith("list/sensors"):
+            return self._encode("sensors", self._sensors)
+        return super().post(
+            url, data=data, headers=headers, verify=verify, timeout=timeout
+        )
+
+
 class FakeMFiClient(client.MFiClient):
     def __init__(self, *args, **kwargs):
+        session = kwargs.pop("session", None)
         if not args:
             args = ("fakehost", "fakeuser", "fakepass")
         super().__init__(*args, **kwargs)
-        self._session = FakeSession()
+        self._session = session or FakeSession()
 
     def _login(self):
         pass
+
+
+class FakeAsyncResponse:
+    def __init__(self, response, url):
+        self.status = response.status_code
+        self.url = url
+        self._response = response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def text(self):
+        return json.dumps(self._response.json())
+
+
+class FakeAsyncSession:
+    """Adapts a :class:`FakeSession` to the bits of aiohttp we use"""
+
+    def __init__(self, session=None):
+        self._session = session or FakeSession()
+
+    def request(self, method, url, ssl=True, data=None):
+        if method == "GET":
+            response = self._session.get(url)
+        else:
+            response = self._session.post(url, data=data)
+        return FakeAsyncResponse(response, url)
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncMFiClient(aio.AsyncMFiClient):
+    def __init__(self, *args, **kwargs):
+        session = kwargs.pop("session", None)
+        if not args:
+            args = ("fakehost", "fakeuser", "fakepass")
+        super().__init__(*args, session=FakeAsyncSession(session), **kwargs)
+
+    async def _login(self):
+        pass
@@ -0,0 +1,116 @@
+"""
+Timing and traffic statistics for clients.
+
+Clients call each of their ``hooks`` as ``hook(event, name, elapsed,
+nbytes)`` with these events:
+
+``request``
+    One HTTP round trip; name is the endpoint (``stat/device``,
+    ``list/sensors``, ``login``...) and nbytes the response body size.
+``relogin``
+    ``retries_login`` is logging in again; name is the retried method.
+``retry``
+    A failed request is about to be retried; name is the endpoint and
+    elapsed the delay before the retry.
+``decode``
+    Time spent decoding a JSON response.
+``build``
+    Time spent building the topology index or Device/Port objects; name
+    is ``topology``, ``get_devices`` or ``get_port``.
+
+:class:`ClientStats` is a hook that aggregates all of them.
+"""
+
+import bisect
+import collections
+import io
+import math
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """The upper bound of the bucket holding the q quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts, strict=True):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.bytes = 0
+
+
+class ClientStats:
+    """Aggregate client hook events into per-endpoint and per-phase totals"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.endpoints = collections.defaultdict(EndpointStats)
+        self.relogins = 0
+        self.retries = 0
+        self.phases = collections.Counter()
+
+    def __call__(self, event, name, elapsed=0.0, nbytes=0):
+        if event == "request":
+            stats = self.endpoints[name]
+            stats.latency.add(elapsed)
+            stats.bytes += nbytes
+        elif event == "relogin":
+            self.relogins += 1
+        elif event == "retry":
+            self.retries += 1
+        else:
+            self.phases[event] += elapsed
+            self.phases["%s:%s" % (event, name)] += elapsed
+
+    def report(self):
+        out = io.StringIO()
+        fmt = "%-24s %6s %10s %10s %10s %12s\n"
+        out.write(
+            fmt % ("endpoint", "count", "total ms", "mean ms", "p90 <= ms", "bytes")
+        )
+        for name, stats in sorted(self.endpoints.items()):
+            latency = stats.latency
+            out.write(
+                fmt
+                % (
+                    name,
+                    latency.count,
+                    "%.1f" % (latency.total * 1000),
+                    "%.1f" % (latency.mean * 1000),
+                    "%g" % (latency.quantile(0.9) * 1000),
+                    stats.bytes,
+                )
+            )
+        for name, elapsed in sorted(self.phases.items()):
+            out.write("%-24s %17s\n" % (name, "%.1f" % (elapsed * 1000)))
+        out.write("%-24s %6i\n" % ("relogins", self.relogins))
+        out.write("%-24s %6i\n" % ("retries", self.retries))
+        return out.getvalue()
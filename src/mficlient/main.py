@@ -1,32 +1,79 @@
+"""
+The ``mfi`` command line tool.
+
+Only what parsing the command line needs is imported up front; the client,
+``requests`` and the modules behind each command are imported when the
+command runs, so ``mfi --help`` and one-shot commands start quickly.
+"""
+
 import argparse
-import json
 import os
-import pprint
+import sys
 import time
-from datetime import datetime
 
-import requests
+DEFAULT_EXPORTER_LISTEN = "127.0.0.1:9490"
+
+# Commands that can run across every controller of a fleet
+FLEET_COMMANDS = ("dump_sensors", "sensors_csv", "control_device")
+
+# Commands that keep running until they are stopped
+LONG_RUNNING_COMMANDS = ("serve", "exporter")
 
-from mficlient import client
-from mficlient.client import TIME_FORMAT
+# Seconds a long-running command or a fleet waits for a controller to
+# answer, unless --timeout or the connection settings say otherwise
+DEFAULT_READ_TIMEOUT = 30
+
+SENSOR_CSV_KEYS = (
+    "active_pwr",
+    "energy_sum",
+    "i_rms",
+    "v_rms",
+    "label",
+    "model",
+    "output",
+    "output_val",
+    "pf",
+    "port",
+    "tag",
+    "val",
+    "wattHours",
+    "wattHoursBase",
+)
 
 
 class Application:
-    def main(self):
-        try:
-            requests.packages.urllib3.disable_warnings()
-        except:  # noqa: E722
-            pass
+    def parse_args(self, argv=None):
         commands = [x[4:] for x in dir(self) if x.startswith("cmd")]
         command_list = os.linesep + os.linesep.join(commands)
 
         parser = argparse.ArgumentParser()
         parser.add_argument("command", help="One of: %s" % command_list)
-        parser.add_argument("--device", help="Specific device")
+        parser.add_argument(
+            "--device",
+            action="append",
+            help="Specific device (may be repeated for control_device)",
+        )
         parser.add_argument("--property", help="Show only this property of a device")
         parser.add_argument("--state", help="State to set (on or off)")
         parser.add_argument(
-            "--every", type=int, default=0, help="Repeat (interval in seconds)"
+            "--every",
+            type=int,
+            default=0,
+            help="Repeat (interval in seconds while sensors are changing)",
+        )
+        parser.add_argument(
+            "--idle-every",
+            type=int,
+            metavar="SECS",
+            help="With --every, slow down to this interval while no sensor "
+            "changes (default: four times --every)",
+        )
+        parser.add_argument(
+            "--stat-every",
+            type=int,
+            metavar="SECS",
+            help="With --every, refresh the device list this often "
+            "(default: ten times --every)",
         )
         parser.add_argument(
             "--since",
@@ -35,6 +82,36 @@ class Application:
             metavar="SECS",
             help="Show data since SECS seconds ago",
         )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=3600,
+            metavar="SECS",
+            help="Fetch history SECS seconds at a time",
+        )
+        parser.add_argument(
+            "--output",
+            metavar="PATH",
+            help="File to write recorded or exported data to (export "
+            "defaults to stdout), or to keep energy totals in",
+        )
+        parser.add_argument(
+            "--format",
+            default="csv",
+            help="Output format for export: csv, jsonl or columnar",
+        )
+        parser.add_argument(
+            "--period",
+            default="day",
+            help="Period of the energy report: hour, day or month",
+        )
+        parser.add_argument(
+            "--listen",
+            metavar="ADDRESS",
+            help="Address to serve on: Unix socket path or host:port for serve "
+            "(default: mficlient.sock in $XDG_RUNTIME_DIR or the cache "
+            "directory), host:port for exporter (default %s)" % DEFAULT_EXPORTER_LISTEN,
+        )
         parser.add_argument(
             "--column-headers",
             default=False,
@@ -53,48 +130,214 @@ class Application:
             action="store_true",
             help="Do not verify server SSL certificate",
         )
-        args = parser.parse_args()
+        parser.add_argument(
+            "--fleet",
+            metavar="PATH",
+            help="Run against every controller listed in this file "
+            "(default: those in $MFI_FLEET, if set)",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            metavar="SECS",
+            help="Give up on a controller that does not connect or answer "
+            "within SECS seconds",
+        )
+        parser.add_argument(
+            "--session-cache",
+            default=False,
+            action="store_true",
+            help="Reuse the login session between runs",
+        )
+        parser.add_argument(
+            "--profile",
+            default=False,
+            action="store_true",
+            help="Print a timing breakdown to stderr after each run",
+        )
+        args = parser.parse_args(argv)
+        args.devices = args.device or []
+        args.device = args.devices[0] if args.devices else None
+        return args
+
+    def _is_fleet(self):
+        from mficlient import fleet
+
+        return isinstance(self._client, fleet.FleetClient)
+
+    def main(self):
+        args = self.parse_args()
 
         if not hasattr(self, "cmd_%s" % args.command):
             print("No such command `%s'" % args.command)
             return 1
 
-        host, port, user, _pass, path, tls = client.get_auth_from_env()
-        self._client = client.MFiClient(
-            host, user, _pass, port=port, use_tls=tls, verify=not args.noverify
-        )
+        import requests
+
+        from mficlient import client, fleet
+
+        try:
+            requests.packages.urllib3.disable_warnings()
+        except:  # noqa: E722
+            pass
+
+        stats = None
+        if args.profile:
+            from mficlient import instrument
+
+            stats = instrument.ClientStats()
+        cache = None
+        if args.session_cache:
+            from mficlient import session
+
+            cache = session.SessionCache()
+        kwargs = {
+            "verify": not args.noverify,
+            "session_cache": cache,
+            "hooks": [stats] if stats else (),
+        }
+        if args.timeout:
+            kwargs["connect_timeout"] = kwargs["read_timeout"] = args.timeout
+        if args.every:
+            # Commands and the scheduler's probe share one fetch per cycle
+            kwargs["sensors_ttl"] = args.every / 2
+            kwargs["stat_ttl"] = args.stat_every or args.every * 10
+        if args.fleet:
+            entries = fleet.load_fleet(args.fleet)
+        elif args.command in FLEET_COMMANDS:
+            entries = fleet.fleet_from_env()
+        else:
+            # Other commands keep using the single controller of $MFI
+            entries = []
+        defaults = {}
+        if args.every or args.command in LONG_RUNNING_COMMANDS or entries:
+            # One stalled controller must not hold up every later poll
+            defaults["read_timeout"] = DEFAULT_READ_TIMEOUT
+        if entries:
+            if args.command not in FLEET_COMMANDS:
+                print("Command `%s' does not support fleets" % args.command)
+                return 1
+            self._client = fleet.FleetClient.from_entries(
+                entries, defaults=defaults, **kwargs
+            )
+        else:
+            auth = client.get_auth_from_env(options=True)
+            host, port, user, _pass, _path, tls, options = auth
+            self._client = client.MFiClient(
+                host,
+                user,
+                _pass,
+                port=port,
+                use_tls=tls,
+                **{**defaults, **options, **kwargs},
+            )
 
-        while True:
+        def run():
             getattr(self, "cmd_%s" % args.command)(args)
-            if not args.every:
-                break
-            time.sleep(args.every)
+            if stats:
+                sys.stderr.write(stats.report())
+                stats.reset()
 
-    def cmd_dump_sensors(self, options):
-        devices = self._client.get_devices()
+        if not args.every:
+            run()
+            return
+
+        from mficlient import schedule
+
+        def failed(error):
+            sys.stderr.write("Failed: %s\n" % error)
+
+        if self._is_fleet():
+
+            def probe():
+                by_controller = self._client.get_raw_sensors()
+                return [s for sensors in by_controller.values() for s in sensors]
+
+        else:
+            probe = self._client.get_raw_sensors
+        scheduler = schedule.Scheduler(args.every, idle_interval=args.idle_every)
+        # serve runs its own loop, and clears --every when it is done
+        scheduler.run(run, probe=probe, on_error=failed, until=lambda: not args.every)
 
+    def _fleet_errors(self):
+        for name, error in self._client.errors.items():
+            sys.stderr.write("Controller `%s' failed: %s\n" % (name, error))
+
+    def cmd_dump_sensors(self, options):
         fmt = "%20s | %20s | %15s | %10s | %s"
-        print(fmt % ("Model", "Label", "Tag", "Value", "Extra"))
-        print("-" * 78)
-        for device in devices:
-            for port in device.ports.values():
-                print(fmt % (port.model, port.label, port.tag, port.value, port.output))
+        columns = ("Model", "Label", "Tag", "Value", "Extra")
+        width = 78
+        is_fleet = self._is_fleet()
+        if is_fleet:
+            by_controller = self._client.get_devices()
+            fmt = "%15s | " + fmt
+            columns = ("Controller", *columns)
+            width += 18
+        else:
+            by_controller = {None: self._client.get_devices()}
+
+        print(fmt % columns)
+        print("-" * width)
+        for name, devices in by_controller.items():
+            for device in devices:
+                for port in device.ports.values():
+                    row = (port.model, port.label, port.tag, port.value, port.output)
+                    print(fmt % (row if name is None else (name, *row)))
+        if is_fleet:
+            self._fleet_errors()
+
+    def cmd_watch(self, options):
+        from mficlient import delta
+
+        if not hasattr(self, "_delta"):
+            fields = options.property and [options.property]
+            self._delta = delta.DeltaEngine(self._client, fields=fields)
+        for change in self._delta.poll():
+            port = change.port
+            if options.devices and port.label not in options.devices:
+                continue
+            if change.kind == delta.CHANGED:
+                print(
+                    "%s: %s %s -> %s"
+                    % (port.label, change.field, change.old, change.new)
+                )
+            else:
+                print("%s: %s" % (port.label, change.kind))
+
+    def cmd_record(self, options):
+        if not options.output:
+            print("Must specify an output file")
+            return
+        if not hasattr(self, "_recorder"):
+            from mficlient import recorder
+
+            self._recorder = recorder.Recorder(options.output)
+        sensors = self._client.get_raw_sensors()
+        if options.devices:
+            sensors = [x for x in sensors if x["label"] in options.devices]
+        self._recorder.record(sensors)
+
+    def cmd_serve(self, options):
+        from mficlient import server
+
+        daemon = server.Daemon(self._client, interval=options.every or 10)
+        options.every = 0
+        daemon.serve(options.listen or server.default_address())
+
+    def cmd_exporter(self, options):
+        from mficlient import exporter
+
+        exporter.Exporter(self._client).serve(options.listen or DEFAULT_EXPORTER_LISTEN)
 
     def cmd_raw_sensors(self, options):
         data = self._client.get_raw_sensors()
         if options.device:
             data = [x for x in data if x["label"] == options.device]
-        if options.json:
-            print(json.dumps(data))
-        else:
-            pprint.pprint(data)
+        _print_data(data, options.json)
 
     def cmd_raw_status(self, options):
         data = self._client.get_raw_status()
-        if options.json:
-            print(json.dumps(data))
-        else:
-            pprint.pprint(data)
+        _print_data(data, options.json)
 
     def cmd_control_device(self, options):
         if not options.device:
@@ -103,20 +346,18 @@ class Application:
         if not options.state:
             print("Must specify a state")
             return
-        port = self._client.get_port(label=options.device)
-        port.control(options.state == "on")
+        state = options.state == "on"
+        results = self._client.control_ports(dict.fromkeys(options.devices, state))
+        for label, result in results.items():
+            if not result.ok:
+                print("Failed to control `%s': %s" % (label, result.error))
 
     def cmd_get_data(self, options):
         if not options.device:
             print("Must specify a device")
             return
 
-        devices = self._client.get_devices()
-        port = None
-        for dev in devices:
-            for port in dev.ports.values():
-                if port.label == options.device:
-                    break
+        port = self._client.get_port(label=options.device)
         if port is None:
             print("No such port %s" % options.device)
             return
@@ -134,50 +375,143 @@ class Application:
             print(",".join(headers))
         print(",".join(data))
 
-    def cmd_sensors_csv(self, options):
-        if not options.device:
+    def cmd_get_history(self, options):
+        if not options.devices:
             print("Must specify a device")
             return
-        sensors = self._client.get_raw_sensors()
-        keys = [
-            "active_pwr",
-            "energy_sum",
-            "i_rms",
-            "v_rms",
-            "label",
-            "model",
-            "output",
-            "output_val",
-            "pf",
-            "port",
-            "tag",
-            "val",
-            "wattHours",
-            "wattHoursBase",
-        ]
-        the_sensor = None
-        for sensor in sensors:
-            if sensor["label"] == options.device:
-                the_sensor = sensor
-                break
-
-        if not the_sensor:
-            print("No such device `%s'" % options.device)
+        if options.chunk <= 0:
+            print("--chunk must be positive")
             return
 
-        rpt_time = datetime.fromtimestamp(sensor["rpt_time"] / 1000)
+        tags = options.property and [options.property]
+        end = time.time()
+        samples = self._client.iter_device_data(
+            options.devices,
+            tags=tags,
+            start=end - options.since,
+            end=end,
+            chunk=options.chunk,
+        )
+        if options.column_headers:
+            print("time,id,tag,value")
+        from datetime import datetime
+
+        from mficlient.client import TIME_FORMAT
+
+        for ident, tag, sample in samples:
+            stamp = datetime.fromtimestamp(sample[0] / 1000)
+            print("%s,%s,%s,%s" % (stamp.strftime(TIME_FORMAT), ident, tag, sample[1]))
+
+    def cmd_export(self, options):
+        from mficlient import export
+
+        if options.format not in export.FORMATS:
+            print("Unknown format `%s'" % options.format)
+            return
+        sensors = self._client.get_raw_sensors()
+        if options.devices:
+            sensors = export.select(sensors, options.devices)
+        binary = options.format == "columnar"
+        if options.output:
+            if binary:
+                out = open(options.output, "wb")
+            else:
+                out = open(options.output, "w", newline="")
+        else:
+            out = sys.stdout.buffer if binary else sys.stdout
         try:
-            wh_rpt_time = datetime.fromtimestamp(sensor["wh_rpt_time"] / 1000)
-        except KeyError:
-            wh_rpt_time = ""
+            export.export(sensors, out, options.format)
+        finally:
+            if options.output:
+                out.close()
+            else:
+                out.flush()
+
+    def cmd_energy(self, options):
+        if not options.output:
+            print("Must specify an output file")
+            return
+        from mficlient import energy
+
+        if options.period not in energy.PERIODS:
+            print("Unknown period `%s'" % options.period)
+            return
+        if not hasattr(self, "_ledger"):
+            self._ledger = energy.EnergyLedger(options.output)
+        self._ledger.add(self._client.get_raw_sensors())
+        self._ledger.flush()
+        if options.every:
+            # Only keep the totals up to date while repeating
+            return
+
+        if options.column_headers:
+            print("period,kind,name,kWh")
+        for kind in (energy.PORT, energy.DEVICE):
+            for key, buckets in sorted(
+                self._ledger.totals(options.period, kind).items()
+            ):
+                name = self._ledger.label(key) if kind == energy.PORT else key
+                if options.devices and name not in options.devices:
+                    continue
+                for bucket, wh in sorted(buckets.items()):
+                    print("%s,%s,%s,%.3f" % (bucket, kind, name, wh / 1000))
 
-        vals = [str(sensor.get(k, "")) for k in keys]
-        vals.insert(0, rpt_time.strftime(TIME_FORMAT))
-        vals.append((wh_rpt_time and wh_rpt_time.strftime(TIME_FORMAT)) or "")
-        keys.insert(0, "time")
-        keys.append("wh_rpt_time")
+    def cmd_sensors_csv(self, options):
+        if not options.device:
+            print("Must specify a device")
+            return
+        from datetime import datetime
+
+        from mficlient import fleet
+        from mficlient.client import TIME_FORMAT
+
+        keys = ["time", *SENSOR_CSV_KEYS, "wh_rpt_time"]
+        if self._is_fleet():
+            by_controller = self._client.get_raw_sensors()
+            matches = [
+                (name, sensor)
+                for name, label in fleet.split_key(options.device, by_controller)
+                for sensor in by_controller[name]
+                if sensor["label"] == label
+            ]
+            keys.insert(0, "controller")
+            self._fleet_errors()
+        else:
+            sensors = self._client.get_raw_sensors()
+            matches = [
+                (None, sensor)
+                for sensor in sensors
+                if sensor["label"] == options.device
+            ][:1]
+
+        if not matches:
+            print("No such device `%s'" % options.device)
+            return
 
         if options.column_headers:
             print(",".join(keys))
 
-        print(",".join(vals))
+        for name, sensor in matches:
+            rpt_time = datetime.fromtimestamp(sensor["rpt_time"] / 1000)
+            try:
+                wh_rpt_time = datetime.fromtimestamp(sensor["wh_rpt_time"] / 1000)
+            except KeyError:
+                wh_rpt_time = ""
+
+            vals = [str(sensor.get(k, "")) for k in SENSOR_CSV_KEYS]
+            vals.insert(0, rpt_time.strftime(TIME_FORMAT))
+            vals.append((wh_rpt_time and wh_rpt_time.strftime(TIME_FORMAT)) or "")
+            if name is not None:
+                vals.insert(0, name)
+            print(",".join(vals))
+
+
+def _print_data(data, as_json=False):
+    if as_json:
+        import json
+
+        print(json.dumps(data))
+    else:
+        import pprint
+
+        pprint.pprint(data)
@@ -0,0 +1,203 @@
+"""
+Append-only on-disk store for polled sensor readings.
+
+Readings are written as fixed-width little-endian records::
+
+    time (double, seconds) | port index (uint32) | pad | one double per field
+
+after a 16 byte header. Ports are numbered in the order they are first
+seen; the mapping back to ids and labels lives in a ``<path>.ports`` file
+with one JSON object per line. Reads go through ``mmap``.
+"""
+
+import collections
+import json
+import math
+import mmap
+import os
+import struct
+import time
+
+RECORD_FIELDS = (
+    "val",
+    "active_pwr",
+    "energy_sum",
+    "i_rms",
+    "v_rms",
+    "pf",
+    "output",
+    "wattHours",
+    "wattHoursBase",
+)
+
+MAGIC = b"MFIREC1\0"
+HEADER = struct.Struct("<8sI4x")
+
+Sample = collections.namedtuple("Sample", ["time", "ident", "values"])
+Bucket = collections.namedtuple(
+    "Bucket", ["start", "ident", "min", "max", "avg", "count"]
+)
+
+
+class Recorder:
+    """
+    Record ``list/sensors`` readings and query them back.
+
+    :param path: The data file; created if it does not exist
+    :param fields: Numeric sensor fields stored in each record. Must match
+                   the fields of an existing file.
+    """
+
+    def __init__(self, path, fields=RECORD_FIELDS):
+        self.path = path
+        self.fields = tuple(fields)
+        self._record = struct.Struct("<dI4x%id" % len(self.fields))
+        self._ports = []
+        self._index = {}
+        self._last = {}
+
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                magic, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or count != len(self.fields):
+                raise ValueError("%s is not a recording of %s" % (path, fields))
+        else:
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, len(self.fields)))
+
+        if os.path.exists(self._ports_path):
+            with open(self._ports_path) as f:
+                for line in f:
+                    self._add_port(json.loads(line))
+
+    @property
+    def _ports_path(self):
+        return self.path + ".ports"
+
+    @property
+    def ports(self):
+        """The recorded ports as dicts with ``_id`` and ``label``"""
+        return list(self._ports)
+
+    def _add_port(self, info):
+        self._index[info["_id"]] = len(self._ports)
+        self._ports.append(info)
+
+    def _port_index(self, sensor, new_ports):
+        ident = sensor["_id"]
+        index = self._index.get(ident)
+        if index is None:
+            info = {"_id": ident, "label": sensor.get("label")}
+            self._add_port(info)
+            new_ports.append(info)
+            index = self._index[ident]
+        return index
+
+    def record(self, sensors, now=None):
+        """
+        Append one reading per sensor.
+
+        The record time is the sensor's ``rpt_time``; readings whose
+        ``rpt_time`` has not moved since the last one recorded by this
+        object are skipped.
+
+        :returns: The number of records written
+        """
+        now = time.time() if now is None else now
+        new_ports = []
+        chunks = []
+        for sensor in sensors:
+            index = self._port_index(sensor, new_ports)
+            stamp = sensor.get("rpt_time")
+            stamp = now if stamp is None else stamp / 1000
+            if self._last.get(index) == stamp:
+                continue
+            self._last[index] = stamp
+            values = [sensor.get(field) for field in self.fields]
+            values = [math.nan if v is None else float(v) for v in values]
+            chunks.append(self._record.pack(stamp, index, *values))
+
+        if new_ports:
+            with open(self._ports_path, "a") as f:
+                for info in new_ports:
+                    f.write(json.dumps(info) + "\n")
+        if chunks:
+            with open(self.path, "ab") as f:
+                f.write(b"".join(chunks))
+        return len(chunks)
+
+    def _iter_records(self):
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER.size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                usable = (size - HEADER.size) // self._record.size
+                view = memoryview(mm)[
+                    HEADER.size : HEADER.size + usable * self._record.size
+                ]
+                records = self._record.iter_unpack(view)
+                try:
+                    yield from records
+                finally:
+                    del records
+                    view.release()
+
+    def query(self, port=None, start=None, end=None):
+        """
+        Read back recorded samples.
+
+        :param port: Only return samples of this port id or label
+        :param start: Only samples at or after this time (seconds)
+        :param end: Only samples before this time (seconds)
+        :returns: A generator of :data:`Sample` tuples, whose values map
+                  field names to values (missing fields are left out)
+        """
+        wanted = None
+        if port is not None:
+            wanted = {
+                i
+                for i, info in enumerate(self._ports)
+                if port in (info["_id"], info["label"])
+            }
+        for record in self._iter_records():
+            stamp, index = record[0], record[1]
+            if wanted is not None and index not in wanted:
+                continue
+            if (start is not None and stamp < start) or (
+                end is not None and stamp >= end
+            ):
+                continue
+            values = {
+                field: value
+                for field, value in zip(self.fields, record[2:], strict=True)
+                if not math.isnan(value)
+            }
+            yield Sample(stamp, self._ports[index]["_id"], values)
+
+    def downsample(self, bucket, field="val", port=None, start=None, end=None):
+        """
+        Reduce samples of one field to min/max/avg per time bucket.
+
+        :param bucket: Bucket width in seconds
+        :returns: A list of :data:`Bucket` tuples ordered by start time
+                  and port id
+        """
+        stats = {}
+        for sample in self.query(port=port, start=start, end=end):
+            if field not in sample.values:
+                continue
+            value = sample.values[field]
+            key = (sample.time // bucket * bucket, sample.ident)
+            entry = stats.get(key)
+            if entry is None:
+                stats[key] = [value, value, value, 1]
+            else:
+                entry[0] = min(entry[0], value)
+                entry[1] = max(entry[1], value)
+                entry[2] += value
+                entry[3] += 1
+        return [
+            Bucket(key[0], key[1], low, high, total / count, count)
+            for key, (low, high, total, count) in sorted(stats.items())
+        ]
@@ -0,0 +1,285 @@
+"""
+Alert rules evaluated against successive ``list/sensors`` payloads.
+
+A :class:`Rule` compares one field of a port (or of every port) with a
+threshold, or watches it for changes. :class:`RuleEngine` compiles a set
+of rules once, indexed by port and field, so each payload only costs the
+rules of the fields that moved, plus those waiting out a duration.
+
+Threshold rules fire once the condition has held for ``duration`` seconds
+and clear when the reading is back past ``clear`` (default: the threshold
+itself), so a reading hovering around the threshold does not flap::
+
+    active_pwr > 1500 for 30s clear 1400 on Heater
+    output changed on Relay Control
+
+"""
+
+import collections
+import operator
+import re
+import time
+
+FIRED = "fired"
+CLEARED = "cleared"
+
+CHANGED = "changed"
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+Event = collections.namedtuple(
+    "Event", ["kind", "rule", "ident", "label", "value", "time"]
+)
+
+_RULE = re.compile(
+    r"^\s*(?P<field>\w+)\s+"
+    r"(?:(?P<changed>changed)|(?P<op>[<>=!]=?)\s*(?P<value>\S+))"
+    r"(?:\s+for\s+(?P<duration>[\d.]+)s?)?"
+    r"(?:\s+clear\s+(?P<clear>\S+))?"
+    r"(?:\s+on\s+(?P<port>.+?))?\s*$"
+)
+
+
+def _value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+class Rule:
+    """
+    One alert condition.
+
+    :param field: The sensor field to watch
+    :param op: One of :data:`OPERATORS`, or :data:`CHANGED` to fire on
+               every change of the field
+    :param value: The threshold; for :data:`CHANGED`, only fire on a
+                  change to this value (default: any)
+    :param port: The port id or label to watch (default: every port)
+    :param duration: Seconds the condition must hold before firing
+    :param clear: The threshold the reading must fall back past to clear
+    :param name: What to call the rule (default: its text)
+    """
+
+    def __init__(
+        self, field, op, value=None, port=None, duration=0, clear=None, name=None
+    ):
+        if op != CHANGED and op not in OPERATORS:
+            raise ValueError("Unknown operator `%s'" % op)
+        if op != CHANGED and value is None:
+            raise ValueError("Rule on %s needs a threshold" % field)
+        self.field = field
+        self.op = op
+        self.value = value
+        self.port = port
+        self.duration = duration
+        self.clear = value if clear is None else clear
+        self.name = name or self._text()
+
+    @classmethod
+    def parse(cls, text, name=None):
+        """Parse a rule written like ``active_pwr > 1500 for 30s on Heater``"""
+        match = _RULE.match(text)
+        if match is None:
+            raise ValueError("Cannot parse rule `%s'" % text)
+        parts = match.groupdict()
+        duration = parts["duration"]
+        clear = parts["clear"]
+        return cls(
+            parts["field"],
+            CHANGED if parts["changed"] else parts["op"],
+            value=None if parts["value"] is None else _value(parts["value"]),
+            port=parts["port"],
+            duration=float(duration) if duration else 0,
+            clear=None if clear is None else _value(clear),
+            name=name,
+        )
+
+    def _text(self):
+        text = "%s %s" % (self.field, self.op)
+        if self.op != CHANGED:
+            text += " %s" % self.value
+        if self.duration:
+            text += " for %ss" % self.duration
+        if self.clear != self.value:
+            text += " clear %s" % self.clear
+        if self.port:
+            text += " on %s" % self.port
+        return text
+
+    def __repr__(self):
+        return "<Rule %s>" % self.name
+
+
+class _State:
+    """Where one rule stands for one port"""
+
+    __slots__ = ("active", "ident", "label", "rule", "since", "value")
+
+    def __init__(self, rule, ident, label):
+        self.rule = rule
+        self.ident = ident
+        self.label = label
+        self.active = False
+        self.since = None
+        self.value = None
+
+
+class RuleEngine:
+    """
+    Evaluate rules against ``list/sensors`` payloads.
+
+    :param rules: :class:`Rule` objects, or rule texts for :meth:`Rule.parse`
+    :param client: The client used by :meth:`poll`
+    """
+
+    def __init__(self, rules=(), client=None, clock=time.time):
+        self._client = client
+        self._clock = clock
+        self._subscribers = []
+        self._rules = []
+        # port id or label (None for every port) -> field -> rules
+        self._index = {}
+        self._ports = {}
+        self._seen = {}
+        self._pending = set()
+        for rule in rules:
+            self.add(rule)
+
+    @property
+    def rules(self):
+        return list(self._rules)
+
+    def add(self, rule):
+        """Add a rule; every rule then starts over from the next payload"""
+        if isinstance(rule, str):
+            rule = Rule.parse(rule)
+        self._rules.append(rule)
+        self._index.setdefault(rule.port, {}).setdefault(rule.field, []).append(rule)
+        # Rules are compiled per port on first sight, so start afresh
+        self._ports.clear()
+        self._seen.clear()
+        self._pending.clear()
+        return rule
+
+    @property
+    def active(self):
+        """The (rule, port id) pairs of the rules that have fired"""
+        return [
+            (state.rule, state.ident)
+            for compiled in self._ports.values()
+            for states in compiled[1].values()
+            for state in states
+            if state.active
+        ]
+
+    def subscribe(self, callback):
+        """Call callback(event) for every event found by :meth:`update`"""
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _compile(self, ident, label):
+        fields = {}
+        keys = [None, ident]
+        if label is not None and label != ident:
+            keys.insert(1, label)
+        for key in keys:
+            for field, rules in self._index.get(key, {}).items():
+                fields.setdefault(field, []).extend(
+                    _State(rule, ident, label) for rule in rules
+                )
+        return label, fields
+
+    def _states(self, sensor):
+        ident = sensor["_id"]
+        label = sensor.get("label")
+        compiled = self._ports.get(ident)
+        if compiled is None or compiled[0] != label:
+            if compiled is not None:
+                for states in compiled[1].values():
+                    self._pending.difference_update(states)
+            compiled = self._ports[ident] = self._compile(ident, label)
+        return compiled[1]
+
+    def _check(self, state, value, now, events):
+        rule = state.rule
+        previous, state.value = state.value, value
+        if rule.op == CHANGED:
+            if previous is not None and value != previous:
+                if rule.value is None or value == rule.value:
+                    events.append(
+                        Event(FIRED, rule, state.ident, state.label, value, now)
+                    )
+            return
+        if value is None:
+            return
+        test = OPERATORS[rule.op]
+        if state.active:
+            if not test(value, rule.clear):
+                state.active = False
+                events.append(
+                    Event(CLEARED, rule, state.ident, state.label, value, now)
+                )
+        elif test(value, rule.value):
+            if state.since is None:
+                state.since = now
+            if now - state.since >= rule.duration:
+                state.active = True
+                state.since = None
+                self._pending.discard(state)
+                events.append(Event(FIRED, rule, state.ident, state.label, value, now))
+            else:
+                self._pending.add(state)
+        else:
+            state.since = None
+            self._pending.discard(state)
+
+    def update(self, sensors, now=None):
+        """
+        Evaluate the rules affected by one payload.
+
+        Only the rules on fields whose value moved are evaluated, and a
+        sensor dict that is the very one passed last time is skipped, as
+        :class:`mficlient.delta.DeltaEngine` does. Rules waiting out a
+        duration are checked on every call.
+
+        :returns: The :data:`Event` objects, also handed to subscribers
+        """
+        now = self._clock() if now is None else now
+        events = []
+        checked = set()
+        for sensor in sensors:
+            ident = sensor["_id"]
+            if self._seen.get(ident) is sensor:
+                continue
+            self._seen[ident] = sensor
+            for field, states in self._states(sensor).items():
+                value = sensor.get(field)
+                for state in states:
+                    if value == state.value and state not in self._pending:
+                        continue
+                    checked.add(state)
+                    self._check(state, value, now, events)
+
+        for state in list(self._pending - checked):
+            self._check(state, state.value, now, events)
+
+        for callback in self._subscribers:
+            for event in events:
+                callback(event)
+        return events
+
+    def poll(self):
+        """Fetch ``list/sensors`` from the client and :meth:`update`"""
+        return self.update(self._client.get_raw_sensors())
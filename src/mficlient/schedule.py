@@ -0,0 +1,149 @@
+"""
+Adaptive polling.
+
+:class:`Scheduler` runs a task on a fixed grid of deadlines, so the
+cadence does not drift by however long each run takes. The controller
+only reports all sensors at once, so the cadence is what adapts: it is
+``interval`` while any port's readings are moving and stretches towards
+``idle_interval`` while they are all still. Until two polls have been
+observed there is nothing to compare, so the cadence stays at
+``interval``, as it does for good without a probe. It backs off when runs
+fail or when the controller takes a large share of the interval to
+answer.
+"""
+
+import threading
+import time
+
+# The readings that mark a port as busy when they move
+VOLATILE_FIELDS = ("active_pwr", "val")
+
+
+class Scheduler:
+    """
+    Decide when to poll next.
+
+    :param interval: Seconds between runs while ports are changing
+    :param idle_interval: Longest gap between runs while nothing changes
+                          (default: four times interval)
+    :param settle: Seconds a port counts as changing after it last moved
+                   (default: idle_interval)
+    :param max_backoff: Longest gap between runs after failures
+    :param fields: The sensor fields watched for changes
+    """
+
+    def __init__(
+        self,
+        interval,
+        idle_interval=None,
+        settle=None,
+        max_backoff=300,
+        fields=VOLATILE_FIELDS,
+        clock=time.monotonic,
+        wait=None,
+    ):
+        self.interval = interval
+        self.idle_interval = max(idle_interval or interval * 4, interval)
+        self.settle = self.idle_interval if settle is None else settle
+        self.max_backoff = max(max_backoff, self.idle_interval)
+        self.fields = fields
+        self.failures = 0
+        self.observations = 0
+        self.delay = interval
+        self.deadline = None
+        self._clock = clock
+        self._readings = {}
+        self._changed = {}
+        self._stop = threading.Event()
+        self._wait = wait or self._stop.wait
+
+    def observe(self, sensors, now=None):
+        """
+        Note the readings of one poll.
+
+        :returns: The ids of the ports whose readings moved
+        """
+        now = self._clock() if now is None else now
+        moved = []
+        for sensor in sensors:
+            ident = sensor["_id"]
+            reading = tuple(sensor.get(f) for f in self.fields)
+            previous = self._readings.get(ident)
+            if previous is not None and previous != reading:
+                self._changed[ident] = now
+                moved.append(ident)
+            self._readings[ident] = reading
+        self.observations += 1
+        return moved
+
+    def volatile(self, now=None):
+        """The ids of the ports that moved within the last settle seconds"""
+        now = self._clock() if now is None else now
+        for ident, when in list(self._changed.items()):
+            if now - when > self.settle:
+                del self._changed[ident]
+        return set(self._changed)
+
+    def next_delay(self, elapsed=0.0, failed=False, now=None):
+        """
+        Work out the gap to the next run after one has finished.
+
+        :param elapsed: How long the run took
+        :param failed: Whether it failed
+        """
+        if failed:
+            self.failures += 1
+            delay = min(self.interval * 2**self.failures, self.max_backoff)
+        else:
+            self.failures = 0
+            if self.observations < 2 or self.volatile(now):
+                delay = self.interval
+            else:
+                # Ramp up gradually, so a port that just settled is not missed
+                delay = min(self.delay * 2, self.idle_interval)
+        # Keep the controller busy with us at most half the time
+        self.delay = max(delay, elapsed * 2)
+        return self.delay
+
+    def schedule(self, elapsed=0.0, failed=False):
+        """Move the deadline on by the next delay, skipping missed slots"""
+        now = self._clock()
+        delay = self.next_delay(elapsed, failed, now)
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += delay
+        if self.deadline < now:
+            missed = (now - self.deadline) // delay + 1
+            self.deadline += missed * delay
+        return self.deadline
+
+    def run(self, task, probe=None, on_error=None, until=None):
+        """
+        Run task on schedule until :meth:`stop` is called.
+
+        :param probe: Called after each run for the sensors to watch
+        :param on_error: Called with the exception when a run fails;
+                         without it, failures propagate
+        :param until: Called after each run; stop when it returns true
+        """
+        while not self._stop.is_set():
+            start = self._clock()
+            if self.deadline is None:
+                self.deadline = start
+            failed = False
+            try:
+                task()
+                if probe is not None:
+                    self.observe(probe())
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                failed = True
+            if until is not None and until():
+                break
+            deadline = self.schedule(self._clock() - start, failed)
+            self._wait(max(deadline - self._clock(), 0))
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,385 @@
+"""
+Long-running daemon sharing one controller session with local clients.
+
+:class:`Daemon` polls the controller on a schedule and answers JSON
+queries over HTTP, on a Unix socket only its owner can connect to (by
+default) or on a localhost TCP port. Reads are served from the last
+snapshot; only control commands go to the controller. :class:`LocalClient`
+talks to a running daemon.
+
+Endpoints::
+
+    GET  /raw/status          stat/device as last polled
+    GET  /raw/sensors         list/sensors as last polled
+    GET  /devices             devices with their merged port data
+    GET  /port?label=X        one port by label (or ?ident=X)
+    GET  /health              {"polled_at": <time of the last poll>, "error": ...}
+    POST /control             {"ports": {"<id or label>": true, ...}}
+
+A TCP port can be reached by anything running on the machine, web pages
+included. To keep browsers out, requests carrying an ``Origin`` header or
+a ``Host`` other than a loopback name are refused, and ``/control`` only
+accepts ``Content-Type: application/json``, which a page cannot send
+without the browser asking first. Every reply carries the time of the
+last successful poll in ``X-Polled-At``.
+"""
+
+import http.client
+import http.server
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from mficlient.client import ControlResult, DeviceNotFound, Topology
+from mficlient.session import default_directory
+
+LOG = logging.getLogger(__name__)
+
+# Host headers accepted on a TCP port, to refuse DNS rebinding
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def default_address():
+    """A Unix socket in ``$XDG_RUNTIME_DIR`` or the cache directory"""
+    base = os.getenv("XDG_RUNTIME_DIR") or default_directory()
+    return os.path.join(base, "mficlient.sock")
+
+
+def merged_port(topology, portinfo):
+    data = dict(portinfo)
+    try:
+        data.update(topology.sensor(portinfo["_id"]))
+    except DeviceNotFound:
+        pass
+    return data
+
+
+class Daemon:
+    """
+    Keep one client warm and serve its latest snapshot.
+
+    :param client: An authenticated :class:`mficlient.client.MFiClient`
+    :param interval: Seconds between ``list/sensors`` polls
+    :param stat_interval: Seconds between ``stat/device`` polls
+                          (default: ten times interval)
+    """
+
+    def __init__(self, client, interval=10, stat_interval=None):
+        self._client = client
+        self.interval = interval
+        client.cache.ttls["stat"] = stat_interval or interval * 10
+        self._lock = threading.Lock()
+        self._topology = None
+        self._stop = threading.Event()
+        self.polled_at = None
+        self.error = None
+
+    @property
+    def topology(self):
+        if self._topology is None:
+            self.refresh()
+        return self._topology
+
+    def refresh(self):
+        topology = self._client.get_topology()
+        with self._lock:
+            self._topology = topology
+            self.polled_at = time.time()
+            self.error = None
+        return topology
+
+    def poll(self):
+        """
+        Refresh until :meth:`stop` is called.
+
+        Controller errors are logged and retried; until a poll succeeds
+        again the last snapshot is served and :attr:`error` is set.
+        """
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.error = e
+                LOG.warning("Polling the controller failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def health(self):
+        return {
+            "polled_at": self.polled_at,
+            "error": self.error and str(self.error),
+        }
+
+    def stop(self):
+        self._stop.set()
+
+    def control(self, states):
+        """
+        Send commands, then refresh the snapshot. A failed refresh is
+        handled like a failed poll, so the results of the commands that
+        went out are still returned.
+        """
+        results = self._client.control_ports(states)
+        try:
+            self.refresh()
+        except Exception as e:
+            self.error = e
+            LOG.warning("Refreshing after control failed: %s", e)
+        return results
+
+    def devices(self):
+        topology = self.topology
+        return [
+            {
+                "_id": devinfo["_id"],
+                "mac": devinfo.get("mac"),
+                "model": devinfo.get("model"),
+                "name": devinfo.get("name"),
+                "ports": [merged_port(topology, p) for p in topology.ports(devinfo)],
+            }
+            for devinfo in topology.stat
+        ]
+
+    def make_server(self, address):
+        """
+        Create the query server.
+
+        :param address: A Unix socket path (anything containing ``/``) or
+                        ``host:port``
+        """
+        handler = type("Handler", (RequestHandler,), {"daemon": self})
+        if "/" in address:
+            directory = os.path.dirname(address)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+            return UnixHTTPServer(address, handler)
+        host, port = address.rsplit(":", 1)
+        return ThreadingHTTPServer((host, int(port)), handler)
+
+    def serve(self, address):
+        server = self.make_server(address)
+        poller = threading.Thread(target=self.poll, daemon=True)
+        poller.start()
+        try:
+            server.serve_forever()
+        finally:
+            self.stop()
+            server.server_close()
+
+
+class ThreadingHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        # Anyone who can connect can switch outputs
+        os.chmod(self.server_address, 0o600)
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    daemon = None
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return str(self.client_address and self.client_address[0])
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.daemon.polled_at is not None:
+            self.send_header("X-Polled-At", "%.3f" % self.daemon.polled_at)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _refused(self):
+        """Reply with an error to a request that may come from a browser"""
+        if self.headers.get("Origin") is not None:
+            self._reply(403, {"error": "Cross-origin requests are refused"})
+            return True
+        if isinstance(self.server.server_address, str):
+            # Browsers cannot reach a Unix socket
+            return False
+        host = urllib.parse.urlsplit("//%s" % self.headers.get("Host", "")).hostname
+        if host not in (*LOCAL_HOSTS, self.server.server_address[0]):
+            self._reply(403, {"error": "Unexpected Host header"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self._refused():
+            return
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if url.path == "/raw/status":
+                self._reply(200, self.daemon.topology.stat)
+            elif url.path == "/raw/sensors":
+                self._reply(200, self.daemon.topology.sensors)
+            elif url.path == "/devices":
+                self._reply(200, self.daemon.devices())
+            elif url.path == "/health":
+                self._reply(200, self.daemon.health())
+            elif url.path == "/port":
+                topology = self.daemon.topology
+                portinfo = topology.port_cfg(
+                    ident=query.get("ident"), label=query.get("label")
+                )
+                self._reply(200, merged_port(topology, portinfo))
+            else:
+                self._reply(404, {"error": "No such endpoint"})
+        except DeviceNotFound as e:
+            self._reply(404, {"error": str(e)})
+        except Exception as e:
+            self._reply(502, {"error": repr(e)})
+
+    def do_POST(self):
+        if self._refused():
+            return
+        if self.path != "/control":
+            self._reply(404, {"error": "No such endpoint"})
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0]
+        if content_type.strip().lower() != "application/json":
+            self._reply(415, {"error": "Expected Content-Type: application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            states = json.loads(self.rfile.read(length))["ports"]
+            if not isinstance(states, dict):
+                raise TypeError()
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {"error": 'Expected {"ports": {...}}'})
+            return
+        try:
+            results = self.daemon.control(states)
+        except Exception as e:
+            self._reply(502, {"error": repr(e)})
+            return
+        self._reply(
+            200,
+            {
+                key: {
+                    "ident": result.ident,
+                    "ok": result.ok,
+                    "error": result.error and str(result.error),
+                }
+                for key, result in results.items()
+            },
+        )
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class DaemonError(Exception):
+    pass
+
+
+class LocalClient:
+    """
+    Query a running :class:`Daemon`.
+
+    Offers the read and control surface of
+    :class:`mficlient.client.MFiClient`, and returns the same Device and
+    Port objects, without logging in to the controller.
+
+    :param address: The daemon's Unix socket path or ``host:port``
+    """
+
+    def __init__(self, address, timeout=10):
+        self._address = address
+        self._timeout = timeout
+
+    def _connection(self):
+        if "/" in self._address:
+            return UnixHTTPConnection(self._address, timeout=self._timeout)
+        host, port = self._address.rsplit(":", 1)
+        return http.client.HTTPConnection(host, int(port), timeout=self._timeout)
+
+    def _request(self, method, path, data=None):
+        conn = self._connection()
+        try:
+            headers = {}
+            body = None
+            if data is not None:
+                body = json.dumps(data)
+                headers["Content-Type"] = "application/json"
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            result = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status == 404:
+            raise DeviceNotFound(result.get("error"))
+        if response.status != 200:
+            raise DaemonError(result.get("error"))
+        return result
+
+    def health(self):
+        """
+        :returns: A dict with the daemon's last successful poll time
+                  (``polled_at``) and its latest polling ``error``
+        """
+        return self._request("GET", "/health")
+
+    def get_raw_status(self):
+        return self._request("GET", "/raw/status")
+
+    def get_raw_sensors(self):
+        return self._request("GET", "/raw/sensors")
+
+    get_stat = get_raw_status
+
+    def get_topology(self, stat=True):
+        if not stat:
+            return Topology(sensors=self.get_raw_sensors())
+        return Topology(self.get_raw_status(), self.get_raw_sensors())
+
+    def get_devices(self):
+        return self.get_topology().make_devices(self)
+
+    def get_port(self, ident=None, label=None):
+        topology = self.get_topology()
+        try:
+            portinfo = topology.port_cfg(ident=ident, label=label)
+        except DeviceNotFound:
+            return None
+        return topology.make_port(self, portinfo)
+
+    def control_ports(self, states):
+        results = self._request("POST", "/control", {"ports": states})
+        return {
+            key: ControlResult(r["ident"], r["ok"], None, r["error"])
+            for key, r in results.items()
+        }
+
+    def _control_port(self, ident, state):
+        result = self.control_ports({ident: state})[ident]
+        if not result.ok:
+            raise DaemonError(result.error)
@@ -0,0 +1,62 @@
+"""On-disk cache of controller login cookies for short-lived processes."""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+def default_directory():
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "mficlient")
+
+
+class SessionCache:
+    """
+    Store session cookies per controller and user.
+
+    Files are only readable by their owner; a cache file that is
+    accessible to anyone else is ignored.
+
+    :param directory: Where to keep the cache files (default:
+                      ``$XDG_CACHE_HOME/mficlient``)
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_directory()
+
+    def _path(self, baseurl, user):
+        key = hashlib.sha256(("%s\0%s" % (baseurl, user)).encode()).hexdigest()
+        return os.path.join(self.directory, "session-%s.json" % key[:32])
+
+    def load(self, baseurl, user):
+        """Return the saved cookies as a dict, or None"""
+        path = self._path(baseurl, user)
+        try:
+            with open(path) as f:
+                info = os.fstat(f.fileno())
+                if info.st_uid != os.getuid() or info.st_mode & 0o077:
+                    return None
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, baseurl, user, cookies):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".session-")
+        try:
+            # mkstemp creates the file 0600
+            with os.fdopen(fd, "w") as f:
+                json.dump(cookies, f)
+            os.replace(tmp, self._path(baseurl, user))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def clear(self, baseurl, user):
+        try:
+            os.unlink(self._path(baseurl, user))
+        except FileNotFoundError:
+            pass
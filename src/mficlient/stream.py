@@ -0,0 +1,107 @@
+"""
+Incremental decoding of controller responses.
+
+The controller wraps every payload as ``{"data": [...], ...}``.
+:func:`iter_json_array` yields the elements of that array one at a time
+from an iterable of byte chunks (such as ``response.iter_content()``), so
+the whole body and the whole object tree never have to be held at once.
+"""
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Read another chunk into the buffer; False at the end of input"""
+        if self.eof:
+            return False
+        for chunk in self._chunks:
+            if isinstance(chunk, bytes):
+                chunk = self._utf8.decode(chunk)
+            if chunk:
+                # Drop what has been consumed so the buffer stays small
+                self.buf = self.buf[self.pos :] + chunk
+                self.pos = 0
+                return True
+        self.eof = True
+        tail = self._utf8.decode(b"", final=True)
+        self.buf = self.buf[self.pos :] + tail
+        self.pos = 0
+        return bool(tail)
+
+    def peek(self):
+        """The next non-whitespace character, or '' at the end of input"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars or not char:
+            raise ValueError("Expected one of %r at %r" % (chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # A number may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, key="data", fields=None):
+    """
+    Yield the elements of the array stored under key in a JSON object.
+
+    :param chunks: An iterable of ``bytes`` or ``str`` pieces of the body
+    :param key: The top-level key holding the array
+    :param fields: If given, reduce each element (a dict) to these keys
+    :raises ValueError: If the body is not such a JSON object
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise ValueError("No %r in response" % key)
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            reader.value()
+        else:
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                element = reader.value()
+                if fields is not None:
+                    element = {f: element[f] for f in fields if f in element}
+                yield element
+                if reader.expect(",]") == "]":
+                    return
+        if reader.expect(",}") == "}":
+            raise ValueError("No %r in response" % key)
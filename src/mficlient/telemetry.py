@@ -0,0 +1,178 @@
+"""
+Columnar storage for port telemetry.
+
+A :class:`TelemetryStore` keeps the numeric fields of many ports in typed
+arrays (one ``array('d')`` per field) instead of one dict per port, which
+is what dominates memory once many snapshots are kept around.
+"""
+
+import array
+import collections.abc
+import math
+
+from mficlient.client import DeviceNotFound, Port
+
+# The numeric fields exported by ``mfi sensors_csv``, plus the report
+# timestamps.
+NUMERIC_FIELDS = (
+    "active_pwr",
+    "energy_sum",
+    "i_rms",
+    "v_rms",
+    "output",
+    "output_val",
+    "pf",
+    "val",
+    "wattHours",
+    "wattHoursBase",
+    "rpt_time",
+    "wh_rpt_time",
+)
+
+TEXT_FIELDS = ("_id", "label", "model", "mac", "port", "tag")
+
+_MISSING = math.nan
+
+
+class TelemetryStore:
+    """
+    Typed, port-indexed columns of telemetry.
+
+    :param keep_raw: Keep a reference to the latest raw sensor dict of
+                     each port so fields outside :data:`NUMERIC_FIELDS`
+                     and :data:`TEXT_FIELDS` can still be read. Without
+                     it those fields are dropped on load.
+    """
+
+    def __init__(self, keep_raw=False):
+        self._numeric = {field: array.array("d") for field in NUMERIC_FIELDS}
+        self._text = {field: [] for field in TEXT_FIELDS}
+        self._rows = {}
+        self._raw = [] if keep_raw else None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, ident):
+        return ident in self._rows
+
+    def row(self, ident):
+        try:
+            return self._rows[ident]
+        except KeyError:
+            raise DeviceNotFound("No sensor %s" % ident)
+
+    def _append(self, ident):
+        row = self._rows[ident] = len(self._rows)
+        for column in self._numeric.values():
+            column.append(_MISSING)
+        for column in self._text.values():
+            column.append(None)
+        if self._raw is not None:
+            self._raw.append(None)
+        return row
+
+    def update(self, sensor):
+        """Store one ``list/sensors`` entry, returning its row"""
+        ident = sensor["_id"]
+        row = self._rows.get(ident)
+        if row is None:
+            row = self._append(ident)
+        if self._raw is not None:
+            self._raw[row] = sensor
+        self.set_fields(row, sensor)
+        return row
+
+    def load(self, sensors):
+        for sensor in sensors:
+            self.update(sensor)
+        return self
+
+    def set_fields(self, row, values):
+        for key, value in values.items():
+            self.set(row, key, value)
+
+    def set(self, row, key, value):
+        if key in self._numeric:
+            self._numeric[key][row] = _MISSING if value is None else float(value)
+        elif key in self._text:
+            self._text[key][row] = value
+        elif self._raw is not None:
+            raw = self._raw[row]
+            if key not in raw or raw[key] != value:
+                # Do not write into the caller's dict
+                raw = self._raw[row] = dict(raw)
+                raw[key] = value
+
+    def delete(self, row, key):
+        if key in self._numeric or key in self._text:
+            self.set(row, key, None)
+        elif self._raw is not None and key in self._raw[row]:
+            raw = self._raw[row] = dict(self._raw[row])
+            del raw[key]
+
+    def get(self, row, key):
+        if key in self._numeric:
+            value = self._numeric[key][row]
+            if math.isnan(value):
+                raise KeyError(key)
+            return value
+        if key in self._text:
+            value = self._text[key][row]
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self._raw is not None:
+            return self._raw[row][key]
+        raise KeyError(key)
+
+    def keys(self, row):
+        keys = [key for key, col in self._numeric.items() if not math.isnan(col[row])]
+        keys.extend(key for key, col in self._text.items() if col[row] is not None)
+        if self._raw is not None:
+            keys.extend(
+                key
+                for key in self._raw[row]
+                if key not in self._numeric and key not in self._text
+            )
+        return keys
+
+    def column(self, key):
+        """The raw column for a field (``nan`` or ``None`` where missing)"""
+        if key in self._numeric:
+            return self._numeric[key]
+        return self._text[key]
+
+    def port(self, client, ident):
+        """A :class:`mficlient.client.Port` whose data lives in this store"""
+        port = Port(client, ident)
+        port._portinfo = PortTelemetry(self, self.row(ident))
+        return port
+
+
+class PortTelemetry(collections.abc.MutableMapping):
+    """Dict-like view of one row of a :class:`TelemetryStore`"""
+
+    __slots__ = ("_row", "_store")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._store.get(self._row, key)
+
+    def __setitem__(self, key, value):
+        self._store.set(self._row, key, value)
+
+    def __delitem__(self, key):
+        self._store.delete(self._row, key)
+
+    def __iter__(self):
+        return iter(self._store.keys(self._row))
+
+    def __len__(self):
+        return len(self._store.keys(self._row))
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -0,0 +1,129 @@
+"""
+Connection settings for the ``requests`` session of a client.
+
+Every setting defaults to what a plain ``requests.Session`` does:
+connections are kept alive in a pool of ten per host, responses are
+compressed where the controller supports it, requests wait for the
+controller forever and nothing is retried.
+"""
+
+import time
+
+import requests
+import requests.adapters
+
+# Gateway errors worth another try; the controller itself answers quickly
+RETRY_STATUS = (502, 503, 504)
+
+
+def _flag(value):
+    return value.lower() not in ("0", "false", "no", "off")
+
+
+# Option name -> parser, for settings taken from the environment or a URL
+OPTIONS = {
+    "pool_size": int,
+    "keep_alive": _flag,
+    "connect_timeout": float,
+    "read_timeout": float,
+    "retries": int,
+    "backoff": float,
+    "compress": _flag,
+}
+
+
+def parse_options(values):
+    """
+    Turn a mapping of :data:`OPTIONS` names to strings into keyword
+    arguments for :class:`mficlient.client.MFiClient`, skipping unset ones.
+    """
+    options = {}
+    for name, parse in OPTIONS.items():
+        value = values.get(name)
+        if value:
+            try:
+                options[name] = parse(value)
+            except ValueError:
+                raise ValueError("Invalid %s `%s'" % (name, value))
+    return options
+
+
+class Transport:
+    """
+    How a client talks HTTP to its controller.
+
+    :param pool_size: Connections kept open to the controller at once
+    :param keep_alive: Reuse connections between requests
+    :param connect_timeout: Seconds to wait for a connection
+    :param read_timeout: Seconds to wait for the controller to answer
+    :param retries: Times an idempotent request is retried after a
+                    connection error, a timeout or a gateway error
+    :param backoff: Seconds before the first retry; doubled for each one
+                    after that
+    :param compress: Ask for compressed responses. Turning it off saves
+                     the controller and the client some work on a fast
+                     local network.
+    """
+
+    def __init__(
+        self,
+        pool_size=None,
+        keep_alive=True,
+        connect_timeout=None,
+        read_timeout=None,
+        retries=0,
+        backoff=0.5,
+        compress=True,
+        sleep=time.sleep,
+    ):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.compress = compress
+        self._sleep = sleep
+
+    def session(self):
+        """Create a ``requests.Session`` with these settings"""
+        session = requests.Session()
+        if self.pool_size:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_size
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        if not self.compress:
+            session.headers["Accept-Encoding"] = "identity"
+        return session
+
+    def request_kwargs(self):
+        """Keyword arguments to pass with every request"""
+        if self.connect_timeout is None and self.read_timeout is None:
+            return {}
+        return {"timeout": (self.connect_timeout, self.read_timeout)}
+
+    def call(self, send, on_retry=None):
+        """
+        Call send() for a response, retrying as configured.
+
+        :param on_retry: Called with the delay before each retry
+        """
+        attempt = 0
+        while True:
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                if attempt >= self.retries or response.status_code not in RETRY_STATUS:
+                    return response
+            delay = self.backoff * 2**attempt
+            if on_retry is not None:
+                on_retry(delay)
+            self._sleep(delay)
+            attempt += 1
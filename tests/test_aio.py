@@ -0,0 +1,167 @@
+import http.server
+import json
+import threading
+import unittest
+import urllib.parse
+from unittest import mock
+
+from mficlient import aio, client, fake
+
+
+class TestAsyncMFiClientWithFakeData(unittest.IsolatedAsyncioTestCase):
+    async def test_get_port(self):
+        client_ = fake.FakeAsyncMFiClient()
+        port = await client_.get_port(label="Relay Control")
+        self.assertEqual("Output 12v", port.model)
+        self.assertEqual("5650b1f29e1141bc88ed29f9", port.ident)
+        self.assertIsNone(await client_.get_port(label="No Such Port"))
+
+    async def test_get_devices(self):
+        client_ = fake.FakeAsyncMFiClient()
+        devs = await client_.get_devices()
+        self.assertEqual(4, len(devs))
+        for device in devs:
+            self.assertTrue(isinstance(device, client.Device))
+            for ident, port in device.ports.items():
+                self.assertEqual(ident, port.ident)
+
+    async def test_control_port(self):
+        client_ = fake.FakeAsyncMFiClient()
+        port = await client_.get_port(label="Relay Control")
+        self.assertEqual(0.0, port.output)
+        await port.control(True)
+        await client_.refresh_port(port)
+        self.assertEqual(1.0, port.output)
+
+    async def test_refresh(self):
+        client_ = fake.FakeAsyncMFiClient()
+        port = await client_.get_port(label="Relay Control")
+        await port.control(True)
+        self.assertIs(port, await port.refresh())
+        self.assertEqual(1.0, port.output)
+        device = (await client_.get_devices())[0]
+        self.assertIs(device, await device.refresh())
+        self.assertEqual(device.ident, device.data["_id"])
+
+    async def test_submit_unavailable(self):
+        client_ = fake.FakeAsyncMFiClient()
+        port = await client_.get_port(label="Relay Control")
+        with self.assertRaises(TypeError):
+            port.submit(True)
+
+    async def test_login_page_body(self):
+        client_ = fake.FakeAsyncMFiClient()
+        with mock.patch.object(client_, "_request") as request:
+            request.side_effect = [
+                (200, "https://fakehost:6443/", "<html>Login</html>"),
+                (200, "", json.dumps({"data": [{"_id": "x"}]})),
+            ]
+            with mock.patch.object(client_, "_login") as login:
+                self.assertEqual([{"_id": "x"}], await client_.get_raw_status())
+                login.assert_awaited_once_with()
+
+            request.side_effect = None
+            request.return_value = (200, "", "<html>Login</html>")
+            with mock.patch.object(client_, "_login"):
+                with self.assertRaises(client.RequestFailed):
+                    await client_.get_raw_status()
+
+    def test_make_session_requires_aiohttp(self):
+        with mock.patch.object(aio, "aiohttp", None):
+            with self.assertRaises(ImportError):
+                aio.make_session()
+
+    async def test_retries_login(self):
+        client_ = fake.FakeAsyncMFiClient()
+        with mock.patch.object(client_, "_request") as request:
+            request.return_value = (302, "", "")
+            with mock.patch.object(client_, "_login") as login:
+                with self.assertRaises(client.RequestFailed):
+                    await client_.get_raw_status()
+                login.assert_awaited_once_with()
+            self.assertEqual(2, request.await_count)
+
+    async def test_gather_devices(self):
+        good = fake.FakeAsyncMFiClient()
+        bad = fake.FakeAsyncMFiClient()
+        with mock.patch.object(bad, "_get_stat", side_effect=client.RequestFailed):
+            results = await aio.gather_devices([good, bad])
+        self.assertEqual(4, len(results[0]))
+        self.assertIsInstance(results[1], client.RequestFailed)
+
+
+class _Controller(http.server.BaseHTTPRequestHandler):
+    """Just enough of a controller to log in and poll over plain HTTP"""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body=b"", headers=()):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _api(self, response):
+        if "session=1" not in self.headers.get("Cookie", ""):
+            self._reply(302, headers=[("Location", "/")])
+        else:
+            self._reply(200, json.dumps(response.json()).encode())
+
+    def do_GET(self):
+        if self.path.startswith("/api/"):
+            self._api(self.server.fake.get(self.path))
+        else:
+            self._reply(200, b"<html>Login</html>")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+        if self.path == "/login":
+            if form.get("username") == "fakeuser":
+                headers = [("Location", "/manage"), ("Set-Cookie", "session=1")]
+            else:
+                headers = [("Location", "/")]
+            self._reply(302, headers=headers)
+        else:
+            self._api(self.server.fake.post(self.path, data=form))
+
+
+@unittest.skipIf(aio.aiohttp is None, "requires aiohttp")
+class TestAsyncMFiClientOverHTTP(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Controller)
+        self.server.fake = fake.FakeSession()
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _client(self, username="fakeuser"):
+        return aio.AsyncMFiClient(
+            "127.0.0.1",
+            username,
+            "fakepass",
+            port=self.server.server_address[1],
+            use_tls=False,
+        )
+
+    async def test_get_devices(self):
+        async with self._client() as client_:
+            devs = await client_.get_devices()
+            self.assertEqual(4, len(devs))
+            port = await client_.get_port(label="Relay Control")
+            await port.control(True)
+            await port.refresh()
+            self.assertEqual(1.0, port.output)
+
+    async def test_rejected_login(self):
+        client_ = self._client(username="nobody")
+        try:
+            with self.assertRaises(client.FailedToLogin):
+                await client_.login()
+        finally:
+            await client_.close()
@@ -0,0 +1,111 @@
+import math
+import unittest
+from unittest import mock
+
+from mficlient import analytics, fake, telemetry
+
+
+def sensors():
+    return [
+        {
+            "_id": "a",
+            "label": "A",
+            "model": "Outlet",
+            "active_pwr": 10.0,
+            "pf": 0.9,
+            "v_rms": 120.0,
+        },
+        {
+            "_id": "b",
+            "label": "B",
+            "model": "Outlet",
+            "active_pwr": 30.0,
+            "pf": 0.5,
+            "v_rms": 121.0,
+        },
+        {
+            "_id": "c",
+            "label": "C",
+            "model": "Output 12v",
+            "active_pwr": 5.0,
+            "v_rms": 119.5,
+        },
+        {"_id": "d", "label": "D", "model": "Outlet", "pf": 0.95, "v_rms": 150.0},
+        {"_id": "e", "label": "E", "model": "Temp", "val": 21.5, "v_rms": 120.5},
+    ]
+
+
+@unittest.skipIf(analytics.numpy is None, "requires numpy")
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.snap = analytics.Snapshot.from_sensors(sensors())
+
+    def test_columns(self):
+        self.assertEqual(5, len(self.snap))
+        self.assertEqual(["A", "B", "C", "D", "E"], self.snap["label"].tolist())
+        self.assertTrue(math.isnan(self.snap["pf"][2]))
+        self.assertIn("wattHours", self.snap)
+
+    def test_filter(self):
+        low = self.snap.where(self.snap["pf"] < 0.8)
+        self.assertEqual(["B"], low["label"].tolist())
+
+    def test_group_by(self):
+        groups = self.snap.group_by("model")
+        self.assertEqual(["Outlet", "Output 12v", "Temp"], groups.keys)
+        self.assertEqual(
+            {"Outlet": 40.0, "Output 12v": 5.0, "Temp": 0.0}, groups.sum("active_pwr")
+        )
+        self.assertEqual({"Outlet": 3, "Output 12v": 1, "Temp": 1}, groups.count())
+        self.assertEqual(2, groups.count("active_pwr")["Outlet"])
+        self.assertEqual(20.0, groups.mean("active_pwr")["Outlet"])
+        self.assertTrue(math.isnan(groups.mean("active_pwr")["Temp"]))
+        self.assertEqual(0.5, groups.min("pf")["Outlet"])
+        self.assertEqual(0.95, groups.max("pf")["Outlet"])
+
+    def test_group_by_several(self):
+        groups = self.snap.group_by("model", "label")
+        self.assertEqual(5, len(groups))
+        self.assertEqual(30.0, groups.sum("active_pwr")[("Outlet", "B")])
+        self.assertEqual(("Temp", "E"), groups.keys[-1])
+
+    def test_outliers(self):
+        mask = analytics.outliers(self.snap["v_rms"])
+        self.assertEqual(["D"], self.snap.where(mask)["label"].tolist())
+        self.assertFalse(analytics.outliers(self.snap["wattHours"]).any())
+
+    def test_series(self):
+        series = analytics.Snapshot.concat(
+            [self.snap, self.snap.where(self.snap["pf"] > 0.8)]
+        )
+        self.assertEqual(7, len(series))
+        self.assertEqual({0: 5, 1: 2}, series.group_by("snapshot").count())
+
+    def test_from_devices(self):
+        devices = fake.FakeMFiClient().get_devices()
+        snap = analytics.Snapshot.from_devices(devices)
+        self.assertEqual(sum(len(d.ports) for d in devices), len(snap))
+        self.assertIn("Relay Control", snap["label"].tolist())
+
+    def test_from_store(self):
+        store = telemetry.TelemetryStore().load(sensors())
+        snap = analytics.Snapshot.from_store(store)
+        self.assertEqual(45.0, snap.group_by("model").sum("active_pwr")["Outlet"] + 5.0)
+        # The store stays usable, new ports included
+        store.update({"_id": "a", "active_pwr": 12.0})
+        store.update({"_id": "f", "model": "Outlet", "active_pwr": 1.0})
+        self.assertEqual(10.0, snap["active_pwr"][0])
+        self.assertEqual(5, len(snap))
+        self.assertEqual(6, len(analytics.Snapshot.from_store(store)))
+
+    def test_empty(self):
+        snap = analytics.Snapshot.from_sensors([])
+        self.assertEqual(0, len(snap))
+        self.assertEqual({}, snap.group_by("model").max("pf"))
+
+
+class TestWithoutNumpy(unittest.TestCase):
+    def test_requires_numpy(self):
+        with mock.patch.object(analytics, "numpy", None):
+            with self.assertRaises(ImportError):
+                analytics.Snapshot.from_sensors(sensors())
@@ -0,0 +1,56 @@
+import io
+import unittest
+from unittest import mock
+
+from mficlient import bench, client, fake
+
+
+class TestSyntheticSession(unittest.TestCase):
+    def test_payloads(self):
+        session = fake.SyntheticSession(10, ports_per_device=3)
+        c = fake.FakeMFiClient(session=session)
+        devices = c.get_devices()
+        self.assertEqual(10, len(devices))
+        self.assertIn("radio_table", devices[0].data)
+        self.assertEqual(30, sum(len(d.ports) for d in devices))
+        self.assertEqual({"device": 1, "sensors": 1}, dict(session.requests))
+
+    def test_control(self):
+        c = fake.FakeMFiClient(session=fake.SyntheticSession(2))
+        port = c.get_port(label="Outlet 1-2")
+        port.control(False)
+        self.assertEqual(0.0, c.get_port(label="Outlet 1-2").output)
+        self.assertEqual(1.0, c.get_port(label="Outlet 1-1").output)
+
+    def test_failure_injection(self):
+        session = fake.SyntheticSession(2, failure_rate=1)
+        c = fake.FakeMFiClient(session=session)
+        self.assertRaises(client.RequestFailed, c.get_devices)
+        self.assertEqual(2, session.failures)
+
+    @mock.patch("time.sleep")
+    def test_latency(self, sleep):
+        c = fake.FakeMFiClient(session=fake.SyntheticSession(2, latency=0.5))
+        c.get_devices()
+        sleep.assert_has_calls([mock.call(0.5), mock.call(0.5)])
+
+
+class TestBench(unittest.TestCase):
+    def test_run(self):
+        results = bench.run(5, rounds=2)
+        names = [r.name for r in results]
+        self.assertIn("get_devices", names)
+        self.assertIn("cli dump_sensors", names)
+        for result in results:
+            self.assertEqual(2, len(result.times))
+            self.assertEqual(0, result.errors)
+            self.assertGreater(result.peak, 0)
+        out = io.StringIO()
+        bench.report(results, out=out)
+        self.assertIn("_control_port", out.getvalue())
+
+    def test_only(self):
+        results = bench.run(5, rounds=1, only=["decode"])
+        self.assertEqual(
+            ["decode stat/device", "decode list/sensors"], [r.name for r in results]
+        )
@@ -0,0 +1,101 @@
+import tracemalloc
+
+import pytest
+
+from mficlient import client, exporter, fake, rules, telemetry
+
+PORTS = 10000
+
+
+@pytest.fixture(scope="module")
+def controller():
+    return fake.make_controller(PORTS // 4, ports_per_device=4)
+
+
+@pytest.fixture
+def big_client(controller):
+    status, sensors = controller
+    return fake.FakeMFiClient(session=fake.FakeSession(status, sensors))
+
+
+def test_get_devices_10k_ports(benchmark, big_client):
+    devices = benchmark(big_client.get_devices)
+    assert PORTS == sum(len(device.ports) for device in devices)
+
+
+def test_get_port_10k_ports(benchmark, big_client):
+    port = benchmark(big_client.get_port, label="Outlet 2499-4")
+    assert "Outlet 2499-4" == port.label
+
+
+def test_find_port_10k_ports(benchmark, big_client):
+    ident = "%016x%08x" % (2499, 4)
+    port = benchmark(big_client._find_port, ident=ident)
+    assert ident == port["_id"]
+
+
+def _traced(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def test_telemetry_memory_100k_ports(benchmark):
+    _status, sensors = fake.make_controller(25000, ports_per_device=4)
+
+    ports, dict_bytes = _traced(lambda: [dict(sensor) for sensor in sensors])
+    del ports
+    store, store_bytes = _traced(lambda: telemetry.TelemetryStore().load(sensors))
+    benchmark.extra_info["dict_bytes_per_port"] = dict_bytes / len(sensors)
+    benchmark.extra_info["store_bytes_per_port"] = store_bytes / len(sensors)
+    assert 100000 == len(store)
+    assert store_bytes * 2 < dict_bytes
+
+    benchmark.pedantic(telemetry.TelemetryStore().load, args=(sensors,), rounds=3)
+
+
+def test_exporter_unchanged_scrape_10k_ports(benchmark, controller):
+    status, sensors = controller
+    topology = client.Topology(status, sensors)
+    renderer = exporter.MetricsRenderer()
+    renderer.update(topology)
+
+    def scrape():
+        renderer.update(topology)
+        return renderer.render()
+
+    text = benchmark(scrape)
+    assert PORTS == text.count("mfi_active_power_watts{")
+    assert PORTS == renderer.rendered
+
+
+def test_analytics_group_by_10k_ports(benchmark, controller):
+    analytics = pytest.importorskip("mficlient.analytics")
+    if analytics.numpy is None:
+        pytest.skip("requires numpy")
+    _status, sensors = controller
+    snap = analytics.Snapshot.from_sensors(sensors)
+
+    def query():
+        low = snap.where(snap["pf"] < 0.8)
+        return low.group_by("model").sum("active_pwr")
+
+    totals = benchmark(query)
+    assert PORTS == len(snap)
+    assert totals
+
+
+def test_rules_500_rules_10k_ports(benchmark, controller):
+    _status, sensors = controller
+    engine = rules.RuleEngine(
+        ["active_pwr > 1500 for 30s on Outlet %i-1" % i for i in range(499)]
+        + ["v_rms > 130"]
+    )
+    engine.update(sensors)
+    # Fresh dicts with the same readings, as a non-incremental poll returns
+    payload = [dict(sensor) for sensor in sensors]
+    events = benchmark(engine.update, payload)
+    assert [] == events
@@ -2,7 +2,7 @@ import json
 import unittest
 from unittest import mock
 
-from mficlient import client, fake
+from mficlient import client, delta, fake
 
 
 class TestMFiClientWithFakeData(unittest.TestCase):
@@ -28,6 +28,19 @@ class TestMFiClientWithFakeData(unittest.TestCase):
                     found_port = True
         self.assertTrue(found_port)
 
+    def test_get_port_by_ident(self):
+        client = fake.FakeMFiClient()
+        port = client.get_port(ident="5650b1f29e1141bc88ed29f9")
+        self.assertEqual("Relay Control", port.label)
+        self.assertIsNone(client.get_port(label="No Such Port"))
+
+    def test_port_refresh(self):
+        client_ = fake.FakeMFiClient()
+        port = client.Port(client_, "567af257b1fcced839e98286")
+        port.refresh()
+        self.assertEqual("Water Heater Control", port.label)
+        self.assertEqual(5.667744, port.value)
+
     def test_control_port(self):
         client = fake.FakeMFiClient()
         port = client.get_port(label="Relay Control")
@@ -41,6 +54,269 @@ class TestMFiClientWithFakeData(unittest.TestCase):
         self.assertEqual(0.0, port.output)
 
 
+class TestDeviceData(unittest.TestCase):
+    def test_get_device_data(self):
+        client_ = fake.FakeMFiClient()
+        with mock.patch("time.time", return_value=3600.0):
+            samples = client_.get_device_data("Water Heater Control", since=600)
+        self.assertEqual([[m * 60000, float(m % 60)] for m in range(51, 61)], samples)
+
+    def test_iter_device_data_chunks(self):
+        client_ = fake.FakeMFiClient()
+        with mock.patch.object(
+            client_, "_get_trend", wraps=client_._get_trend
+        ) as get_trend:
+            samples = list(
+                client_.iter_device_data(
+                    ["Relay Control", "567af257b1fcced839e98286"],
+                    start=0,
+                    end=3 * 3600,
+                    chunk=3600,
+                )
+            )
+        self.assertEqual(3, get_trend.call_count)
+        get_trend.assert_called_with(
+            ["5650b1f29e1141bc88ed29f9", "567af257b1fcced839e98286"],
+            ["active_pwr", "output"],
+            7200,
+            10800,
+        )
+        # Two ports with two tags each, one sample per minute
+        self.assertEqual(2 * 2 * 180, len(samples))
+        self.assertEqual(180, len({s[2][0] for s in samples}))
+
+    def test_iter_device_data_bad_chunk(self):
+        client_ = fake.FakeMFiClient()
+        for chunk in (0, -60):
+            with self.assertRaises(ValueError):
+                client_.iter_device_data(["Relay Control"], chunk=chunk)
+
+    def test_get_trend_params(self):
+        with mock.patch.object(client.MFiClient, "_login"):
+            c = client.MFiClient("host", "user", "pass")
+        with mock.patch.object(c, "_session") as mock_session:
+            mock_session.get.return_value.status_code = 200
+            mock_session.get.return_value.json.return_value = {"data": "foo"}
+            self.assertEqual("foo", c._get_trend(["a", "b"], ["amps"], 1, 2.5))
+            mock_session.get.assert_called_once_with(
+                "https://host:6443/api/v1.0/data/m2mgeneric_by_id",
+                params={
+                    "fmt": "json",
+                    "ids": "a,b",
+                    "tags": "amps",
+                    "indices": "1,2,3,4",
+                    "func": "trend",
+                    "collection": "null",
+                    "startTime": 1000,
+                    "endTime": 2500,
+                },
+                verify=True,
+            )
+
+
+class TestControlPorts(unittest.TestCase):
+    def test_control_ports(self):
+        client_ = fake.FakeMFiClient()
+        results = client_.control_ports(
+            {"Relay Control": True, "565876069e1110d8e710f469": True, "Nope": True}
+        )
+        self.assertEqual(
+            ["Relay Control", "565876069e1110d8e710f469", "Nope"], list(results)
+        )
+        self.assertTrue(results["Relay Control"].ok)
+        self.assertEqual("5650b1f29e1141bc88ed29f9", results["Relay Control"].ident)
+        self.assertTrue(results["565876069e1110d8e710f469"].ok)
+        self.assertFalse(results["Nope"].ok)
+        self.assertIsInstance(results["Nope"].error, client.DeviceNotFound)
+        self.assertEqual(1.0, client_.get_port(label="Relay Control").output)
+        self.assertEqual(1.0, client_.get_port(label="Tiny Relay").output)
+
+    def test_control_ports_partial_failure(self):
+        client_ = fake.FakeMFiClient()
+        real_send = client_._send_control
+
+        def send(ident, portinfo, state):
+            if portinfo["label"] == "Tiny Relay":
+                raise client.RequestFailed()
+            return real_send(ident, portinfo, state)
+
+        with mock.patch.object(client_, "_send_control", side_effect=send):
+            results = client_.control_ports({"Relay Control": 1, "Tiny Relay": 1})
+        self.assertTrue(results["Relay Control"].ok)
+        self.assertFalse(results["Tiny Relay"].ok)
+        self.assertIsInstance(results["Tiny Relay"].error, client.RequestFailed)
+
+
+class TestSnapshotCache(unittest.TestCase):
+    def test_ttl_hits(self):
+        client_ = fake.FakeMFiClient(stat_ttl=None, sensors_ttl=60)
+        with mock.patch.object(client_, "_session", wraps=client_._session) as sess:
+            client_.get_devices()
+            client_.get_port(label="Relay Control")
+            client_.get_port(label="Tiny Relay")
+            self.assertEqual(1, sess.get.call_count)
+            self.assertEqual(1, sess.post.call_count)
+        self.assertEqual(2, client_.cache.hits["sensors"])
+        self.assertEqual(1, client_.cache.misses["sensors"])
+        self.assertEqual(2, client_.cache.hits["stat"])
+
+    def test_no_ttl_refetches(self):
+        client_ = fake.FakeMFiClient()
+        client_.get_devices()
+        client_.get_devices()
+        self.assertEqual(2, client_.cache.misses["sensors"])
+        self.assertEqual(0, client_.cache.hits["sensors"])
+
+    @mock.patch("time.monotonic")
+    def test_expiry(self, mock_time):
+        mock_time.return_value = 100
+        cache = client.SnapshotCache({"stat": 10})
+        fetch = mock.MagicMock(side_effect=[1, 2])
+        self.assertEqual(1, cache.get("stat", fetch))
+        mock_time.return_value = 105
+        self.assertEqual(1, cache.get("stat", fetch))
+        mock_time.return_value = 111
+        self.assertEqual(2, cache.get("stat", fetch))
+        self.assertEqual(2, cache.get("stat", fetch, ttl=None))
+
+    def test_control_invalidates_sensors(self):
+        client_ = fake.FakeMFiClient(stat_ttl=None, sensors_ttl=60)
+        port = client_.get_port(label="Relay Control")
+        port.control(True)
+        self.assertEqual(1.0, client_.get_port(label="Relay Control").output)
+        self.assertEqual(2, client_.cache.misses["sensors"])
+        self.assertEqual(1, client_.cache.misses["stat"])
+
+    @mock.patch("time.monotonic")
+    def test_control_uses_stat_ttl(self, mock_time):
+        mock_time.return_value = 100
+        client_ = fake.FakeMFiClient(stat_ttl=10)
+        client_._find_port(device_name="Relay Control")
+        mock_time.return_value = 105
+        client_._find_port(device_name="Relay Control")
+        self.assertEqual(1, client_.cache.misses["stat"])
+        mock_time.return_value = 111
+        client_._find_port(device_name="Relay Control")
+        self.assertEqual(2, client_.cache.misses["stat"])
+
+    def test_control_refetches_missing_port(self):
+        session = fake.FakeSession(*fake.make_controller(2, realistic=True))
+        client_ = fake.FakeMFiClient(session=session)
+        self.assertTrue(client_.control_ports({"Outlet 0-1": True})["Outlet 0-1"].ok)
+        # A device added since stat/device was fetched
+        session._status, session._sensors = fake.make_controller(3, realistic=True)
+        results = client_.control_ports({"Outlet 2-1": True, "Nope": True})
+        self.assertTrue(results["Outlet 2-1"].ok)
+        self.assertFalse(results["Nope"].ok)
+        self.assertEqual(2, client_.cache.misses["stat"])
+        client_.submit_control("Outlet 2-2", True).result()
+        self.assertEqual(2, client_.cache.misses["stat"])
+        session._status, session._sensors = fake.make_controller(4, realistic=True)
+        client_.submit_control("Outlet 3-1", True).result()
+        self.assertEqual(3, client_.cache.misses["stat"])
+        client_.commands.close()
+
+
+class TestTopology(unittest.TestCase):
+    def setUp(self):
+        status, sensors = fake.make_controller(4, ports_per_device=2)
+        self.topology = client.Topology(status, sensors)
+
+    def test_lookups(self):
+        ident = "%016x%08x" % (2, 1)
+        self.assertEqual(8, len(self.topology))
+        self.assertEqual(ident, self.topology.sensor(ident)["_id"])
+        self.assertEqual(ident, self.topology.port_ident(label="Outlet 2-1"))
+        self.assertEqual(
+            ident, self.topology.port_ident(mac="04:18:d6:00:00:02", port="1")
+        )
+        self.assertEqual(
+            "%024x" % 2, self.topology.device(mac="04:18:d6:00:00:02")["_id"]
+        )
+
+    def test_not_found(self):
+        self.assertRaises(client.DeviceNotFound, self.topology.sensor, "foo")
+        self.assertRaises(client.DeviceNotFound, self.topology.port_cfg, label="foo")
+        self.assertRaises(client.DeviceNotFound, self.topology.device, ident="foo")
+
+    def test_lazy_ports(self):
+        device = self.topology.make_device(None, self.topology.stat[1])
+        ident = "%016x%08x" % (1, 2)
+        self.assertEqual(["%016x%08x" % (1, 1), ident], list(device.ports))
+        self.assertEqual({}, device.ports._built)
+        port = device.ports[ident]
+        self.assertIs(port, device.ports[ident])
+        self.assertEqual(1, len(device.ports._built))
+        self.assertNotIn("%016x%08x" % (2, 1), device.ports)
+
+    def test_port_reads_through(self):
+        ident = "%016x%08x" % (2, 1)
+        port = self.topology.make_port(None, self.topology.port_cfg(ident=ident))
+        sensor = self.topology.sensor(ident)
+        self.assertEqual("Outlet 2-1", port.label)
+        port.refresh({"val": 9.0})
+        self.assertEqual(9.0, port.data["val"])
+        self.assertNotEqual(9.0, sensor["val"])
+        port.data["val"] = 8.0
+        self.assertEqual(8.0, json.loads(json.dumps(port.data))["val"])
+        self.assertNotEqual(8.0, sensor["val"])
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.session = fake.SyntheticSession(3, 2)
+        self.client = fake.FakeMFiClient(session=self.session, incremental=True)
+
+    def test_conditional_stat(self):
+        stat = self.client.get_raw_status()
+        self.assertIs(stat, self.client.get_raw_status())
+        self.assertEqual(2, self.session.requests["device"])
+
+    def test_unchanged_sensors(self):
+        topology = self.client.get_topology()
+        self.assertEqual(6, len(self.client.changed_ports))
+        self.assertIs(topology, self.client.get_topology())
+        self.assertEqual(set(), self.client.changed_ports)
+
+    def test_changed_sensor(self):
+        sensors = self.client.get_raw_sensors()
+        ident = "%016x%08x" % (1, 2)
+        self.client._control_port(ident, False)
+        updated = self.client.get_raw_sensors()
+        self.assertEqual({ident}, self.client.changed_ports)
+        self.assertIs(sensors[0], updated[0])
+        self.assertIsNot(sensors[3], updated[3])
+        self.assertEqual(0.0, updated[3]["output"])
+
+    def test_projection_without_report_fields(self):
+        fields = ("_id", "label", "val", "tag", "model")
+        client_ = fake.FakeMFiClient(
+            session=self.session, incremental=True, sensor_fields=fields
+        )
+        sensors = client_.get_raw_sensors()
+        ident = "%016x%08x" % (1, 2)
+        client_._control_port(ident, False)
+        updated = client_.get_raw_sensors()
+        self.assertEqual({ident}, client_.changed_ports)
+        self.assertIs(sensors[0], updated[0])
+        self.assertEqual(0.0, updated[3]["val"])
+
+    def test_plain_fake_session(self):
+        client_ = fake.FakeMFiClient(incremental=True)
+        sensors = client_.get_raw_sensors()
+        self.assertIs(sensors, client_.get_raw_sensors())
+        self.assertEqual(set(), client_.changed_ports)
+
+    def test_delta_skips_unchanged(self):
+        engine = delta.DeltaEngine(self.client)
+        self.assertEqual(6, len(engine.poll()))
+        self.client._control_port("%016x%08x" % (0, 1), False)
+        changes = engine.poll()
+        self.assertEqual(
+            {("val", 0.0), ("output", 0.0)}, {(c.field, c.new) for c in changes}
+        )
+
+
 class TestClientRequests(unittest.TestCase):
     @mock.patch("requests.Session")
     def test_login_success(self, mock_session):
@@ -91,6 +367,38 @@ class TestClientRequests(unittest.TestCase):
             )
             self.assertEqual("foo", result)
 
+    def test_transport_options(self):
+        with mock.patch.object(client.MFiClient, "_login"):
+            c = client.MFiClient(
+                "host", "user", "pass", connect_timeout=3, read_timeout=30, retries=2
+            )
+        c.transport._sleep = mock.MagicMock()
+        with mock.patch.object(c, "_session") as mock_session:
+            failed = mock.MagicMock(status_code=503)
+            ok = mock.MagicMock(status_code=200)
+            ok.json.return_value = {"data": "foo"}
+            mock_session.post.side_effect = [failed, ok]
+            self.assertEqual("foo", c._get_sensors())
+            self.assertEqual(2, mock_session.post.call_count)
+            mock_session.post.assert_called_with(
+                "https://host:6443/api/v1.0/list/sensors",
+                data={"json": json.dumps({"hello": 2})},
+                verify=True,
+                timeout=(3, 30),
+            )
+
+            # Control commands are not retried
+            mock_session.post.side_effect = None
+            mock_session.post.return_value = failed
+            mock_session.post.reset_mock()
+            portinfo = {"model": "m", "mac": "aa", "port": 1}
+            with mock.patch.object(c, "_login"):
+                self.assertRaises(
+                    client.RequestFailed, c._send_control, "ident", portinfo, True
+                )
+            # Once before logging in again and once after
+            self.assertEqual(2, mock_session.post.call_count)
+
     def _test_control_device(self, expected_data=None, model=None, status=200):
         with mock.patch.object(client.MFiClient, "_login"):
             c = client.MFiClient("host", "user", "pass")
@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from mficlient import client, commands, fake
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestCommandQueue(unittest.TestCase):
+    def setUp(self):
+        self.session = fake.SyntheticSession(2, 2)
+        self.client = fake.FakeMFiClient(session=self.session)
+        self.sent = []
+        send = self.client._send_control
+
+        def send_control(ident, portinfo, state):
+            self.sent.append((ident, state))
+            return send(ident, portinfo, state)
+
+        self.client._send_control = send_control
+        self.clock = Clock()
+        self.queue = commands.CommandQueue(
+            self.client, rate=2, clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def output(self, label):
+        return self.client.get_port(label=label).output
+
+    def test_coalesces(self):
+        gate = threading.Event()
+        send = self.client._send_control
+
+        def held(*args):
+            gate.wait(5)
+            return send(*args)
+
+        self.client._send_control = held
+        first = self.queue.submit("Outlet 0-1", True)
+        futures = [
+            self.queue.submit(label, state)
+            for label, state in (
+                ("Outlet 1-1", True),
+                ("Outlet 1-1", False),
+                ("%016x%08x" % (1, 1), True),
+            )
+        ]
+        gate.set()
+        self.queue.close()
+        self.assertEqual("{}", first.result())
+        self.assertEqual(["{}"] * 3, [f.result() for f in futures])
+        self.assertEqual(
+            [("%016x%08x" % (0, 1), True), ("%016x%08x" % (1, 1), True)], self.sent
+        )
+        self.assertEqual(2, self.queue.coalesced)
+        self.assertEqual(1.0, self.output("Outlet 1-1"))
+
+    def test_rate_limit(self):
+        for label in ("Outlet 0-1", "Outlet 0-2", "Outlet 1-1"):
+            self.queue.submit(label, True)
+        self.queue.close()
+        self.assertEqual(3, self.queue.sent)
+        self.assertAlmostEqual(1.0, sum(self.clock.slept))
+
+    def test_errors(self):
+        future = self.queue.submit("nope", True)
+        self.assertIsInstance(future.exception(), client.DeviceNotFound)
+        self.session.failure_rate = 1
+        future = self.queue.submit("Outlet 0-1", True)
+        self.assertIsInstance(future.exception(5), client.RequestFailed)
+        self.queue.close()
+        with self.assertRaises(RuntimeError):
+            self.queue.submit("Outlet 0-1", True)
+
+
+class TestClientQueue(unittest.TestCase):
+    def test_control_rate(self):
+        client_ = fake.FakeMFiClient(control_rate=100)
+        port = client_.get_port(label="Relay Control")
+        port.control(True)
+        self.assertEqual(1, client_.commands.sent)
+        self.assertEqual(1.0, client_.get_port(label="Relay Control").output)
+        port.submit(False).result(5)
+        self.assertEqual(0.0, client_.get_port(label="Relay Control").output)
@@ -0,0 +1,63 @@
+import copy
+import json
+import unittest
+from unittest import mock
+
+from mficlient import delta, fake, fake_data
+
+
+class TestDeltaEngine(unittest.TestCase):
+    def setUp(self):
+        self.client = fake.FakeMFiClient()
+        self.sensors = json.loads(fake_data.FAKE_SENSORS)
+
+    def test_first_update_adds(self):
+        engine = delta.DeltaEngine(self.client)
+        changes = engine.update(self.sensors)
+        self.assertEqual(len(self.sensors), len(changes))
+        self.assertTrue(all(c.kind == delta.ADDED for c in changes))
+        self.assertEqual([], engine.update(copy.deepcopy(self.sensors)))
+
+    def test_changed_fields_update_in_place(self):
+        engine = delta.DeltaEngine(self.client)
+        engine.update(self.sensors)
+        port = engine.ports["567af257b1fcced839e98286"]
+        sensors = copy.deepcopy(self.sensors)
+        sensors[4]["active_pwr"] = 100.0
+        sensors[4]["rpt_time"] += 1000
+        changes = engine.update(sensors)
+        self.assertEqual(
+            [delta.Change(delta.CHANGED, port, "active_pwr", 5.667744, 100.0)],
+            changes,
+        )
+        self.assertIs(port, engine.ports["567af257b1fcced839e98286"])
+        self.assertEqual(100.0, port.data["active_pwr"])
+        self.assertEqual(sensors[4]["rpt_time"], port.data["rpt_time"])
+
+    def test_fields_filter_and_removed(self):
+        engine = delta.DeltaEngine(self.client, fields=["output"])
+        engine.update(self.sensors)
+        sensors = copy.deepcopy(self.sensors[1:])
+        sensors[3]["active_pwr"] = 100.0
+        sensors[3]["output"] = 0.0
+        changes = engine.update(sensors)
+        self.assertEqual(
+            [("changed", "output"), ("removed", None)],
+            [(c.kind, c.field) for c in changes],
+        )
+        self.assertEqual("5650b1f29e1141bc88ed29f9", changes[1].port.ident)
+
+    def test_subscribers_and_poll(self):
+        engine = delta.DeltaEngine(self.client)
+        callback = engine.subscribe(mock.MagicMock())
+        engine.poll()
+        self.assertEqual(len(self.sensors), callback.call_count)
+        self.client.get_port(label="Relay Control").control(True)
+        changes = engine.poll()
+        self.assertIn(
+            ("Relay Control", "output", 1.0),
+            [(c.port.label, c.field, c.new) for c in changes],
+        )
+        engine.unsubscribe(callback)
+        engine.poll()
+        self.assertEqual(len(self.sensors) + len(changes), callback.call_count)
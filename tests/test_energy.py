@@ -0,0 +1,172 @@
+import datetime
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from mficlient import energy
+
+UTC = datetime.timezone.utc
+
+# 2024-05-01 00:00 UTC
+MIDNIGHT = 1714521600
+
+
+def sensor(stamp, wh, base=0.0, ident="p1", mac="aa"):
+    return {
+        "_id": ident,
+        "label": "Port %s" % ident,
+        "mac": mac,
+        "energy_sum": wh - base,
+        "wattHours": wh,
+        "wattHoursBase": base,
+        "wh_rpt_time": stamp * 1000,
+    }
+
+
+class TestEnergyLedger(unittest.TestCase):
+    def setUp(self):
+        self.ledger = energy.EnergyLedger(tz=UTC)
+
+    def test_first_reading_sets_meter(self):
+        self.assertEqual(0, self.ledger.add([sensor(MIDNIGHT, 500)]))
+        self.assertEqual({}, self.ledger.totals())
+
+    def test_rollups(self):
+        self.ledger.add([sensor(MIDNIGHT + 60, 100)])
+        self.ledger.add([sensor(MIDNIGHT + 120, 130)])
+        self.ledger.add([sensor(MIDNIGHT + 180, 150)])
+        self.assertEqual({"p1": {"2024-05-01T00": 50.0}}, self.ledger.totals("hour"))
+        self.assertEqual({"p1": {"2024-05-01": 50.0}}, self.ledger.totals("day"))
+        self.assertEqual(
+            {"aa": {"2024-05": 50.0}},
+            self.ledger.totals("month", energy.DEVICE),
+        )
+
+    def test_device_sums_ports(self):
+        self.ledger.add(
+            [sensor(MIDNIGHT, 0, ident="p1"), sensor(MIDNIGHT, 0, ident="p2")]
+        )
+        self.ledger.add(
+            [
+                sensor(MIDNIGHT + 60, 10, ident="p1"),
+                sensor(MIDNIGHT + 60, 5, ident="p2"),
+            ]
+        )
+        self.assertEqual(15.0, self.ledger.total("day", "2024-05-01", energy.DEVICE))
+        self.assertEqual(5.0, self.ledger.total("day", "2024-05-01", key="p2"))
+
+    def test_stale_reading_skipped(self):
+        self.ledger.add([sensor(MIDNIGHT, 0)])
+        self.ledger.add([sensor(MIDNIGHT + 60, 10)])
+        self.assertEqual(0, self.ledger.add([sensor(MIDNIGHT + 60, 10)]))
+        self.assertEqual(10.0, self.ledger.total("hour", "2024-05-01T00"))
+
+    def test_older_reading_skipped(self):
+        self.ledger.add([sensor(MIDNIGHT, 0)])
+        self.ledger.add([sensor(MIDNIGHT + 60, 10)])
+        self.assertEqual(0, self.ledger.add([sensor(MIDNIGHT + 30, 5)]))
+        self.ledger.add([sensor(MIDNIGHT + 120, 20)])
+        self.assertEqual(20.0, self.ledger.total("hour", "2024-05-01T00"))
+        self.assertEqual(0, self.ledger.resets)
+
+    def test_base_reset(self):
+        self.ledger.add([sensor(MIDNIGHT, 1000)])
+        # The meter was reset at 1000 Wh, and 20 Wh were used since
+        self.ledger.add([sensor(MIDNIGHT + 60, 1020, base=1000)])
+        self.assertEqual(20.0, self.ledger.total("hour", "2024-05-01T00"))
+        self.assertEqual(1, self.ledger.resets)
+
+    def test_counter_restart(self):
+        self.ledger.add([sensor(MIDNIGHT, 1000)])
+        self.ledger.add([sensor(MIDNIGHT + 60, 7)])
+        self.assertEqual(7.0, self.ledger.total("hour", "2024-05-01T00"))
+        self.assertEqual(1, self.ledger.resets)
+
+    def test_gap_is_spread(self):
+        self.ledger.add([sensor(MIDNIGHT - 1800, 0)])
+        self.ledger.add([sensor(MIDNIGHT + 3600, 90)])
+        self.assertEqual(
+            {
+                "2024-04-30T23": 30.0,
+                "2024-05-01T00": 60.0,
+            },
+            self.ledger.totals("hour")["p1"],
+        )
+        self.assertEqual(30.0, self.ledger.total("month", "2024-04"))
+        self.assertEqual(60.0, self.ledger.total("month", "2024-05"))
+
+    def test_no_meter(self):
+        self.assertEqual(0, self.ledger.add([{"_id": "t", "val": 20.5}]))
+        self.assertEqual({}, self.ledger.totals())
+
+    def test_retention(self):
+        with unittest.mock.patch.dict(energy.RETENTION, {"hour": 2}):
+            self.ledger.add([sensor(MIDNIGHT, 0)])
+            for hour in range(1, 4):
+                self.ledger.add([sensor(MIDNIGHT + hour * 3600, hour)])
+        self.assertEqual(
+            ["2024-05-01T01", "2024-05-01T02"], list(self.ledger.totals("hour")["p1"])
+        )
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            self.ledger.totals("week")
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "energy.json")
+            ledger = energy.EnergyLedger(path, tz=UTC)
+            ledger.add([sensor(MIDNIGHT, 0)])
+            ledger.add([sensor(MIDNIGHT + 60, 10)])
+            ledger.save()
+
+            ledger = energy.EnergyLedger(path, tz=UTC)
+            ledger.add([sensor(MIDNIGHT + 120, 25)])
+            self.assertEqual(25.0, ledger.total("day", "2024-05-01"))
+            self.assertEqual("Port p1", ledger.label("p1"))
+
+    def test_journal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "energy.json")
+            ledger = energy.EnergyLedger(path, tz=UTC, compact_every=4)
+            ledger.add([sensor(MIDNIGHT, 0)])
+            ledger.flush()
+            ledger.add([sensor(MIDNIGHT + 60, 10)])
+            ledger.add([sensor(MIDNIGHT + 60, 10)])
+            ledger.flush()
+            self.assertFalse(os.path.exists(path))
+            with open(ledger.journal_path) as f:
+                self.assertEqual(2, len(f.readlines()))
+
+            ledger = energy.EnergyLedger(path, tz=UTC, compact_every=4)
+            self.assertEqual(10.0, ledger.total("day", "2024-05-01"))
+            for minute in (2, 3):
+                ledger.add([sensor(MIDNIGHT + minute * 60, minute * 10)])
+            ledger.flush()
+            # The fourth reading folds the journal into the saved totals
+            self.assertTrue(os.path.exists(path))
+            self.assertFalse(os.path.exists(ledger.journal_path))
+
+            ledger = energy.EnergyLedger(path, tz=UTC)
+            self.assertEqual(30.0, ledger.total("day", "2024-05-01"))
+
+    def test_journal_replay_after_save(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "energy.json")
+            ledger = energy.EnergyLedger(path, tz=UTC)
+            ledger.add([sensor(MIDNIGHT, 0)])
+            ledger.add([sensor(MIDNIGHT + 60, 10)])
+            ledger.flush()
+            with open(ledger.journal_path) as f:
+                journal = f.read()
+            ledger.save()
+            # As if the save was cut short before removing the journal,
+            # which was also torn by a crash
+            with open(ledger.journal_path, "w") as f:
+                f.write(journal + '["p1", "Port p1", "aa", 17')
+
+            ledger = energy.EnergyLedger(path, tz=UTC)
+            self.assertEqual(10.0, ledger.total("day", "2024-05-01"))
+            ledger.flush()
+            self.assertFalse(os.path.exists(ledger.journal_path))
@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+import math
+import unittest
+
+from mficlient import export, fake
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.sensors = json.loads(fake.fake_data.FAKE_SENSORS)
+
+    def test_csv(self):
+        out = io.StringIO()
+        self.assertEqual(len(self.sensors), export.write_csv(self.sensors, out))
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(list(export.FIELDS), rows[0])
+        self.assertEqual(len(self.sensors) + 1, len(rows))
+        row = dict(zip(rows[0], rows[5], strict=True))
+        self.assertEqual(self.sensors[4]["label"], row["label"])
+        self.assertEqual(str(self.sensors[4]["val"]), row["val"])
+
+    def test_jsonl(self):
+        out = io.StringIO()
+        export.write_jsonl(self.sensors, out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(list(export.FIELDS), list(rows[0]))
+        self.assertEqual(self.sensors[4]["_id"], rows[4]["_id"])
+        self.assertIsNone(rows[2]["wattHours"])
+
+    def test_columnar_round_trip(self):
+        sensors = fake.make_controller(3000, ports_per_device=2)[1]
+        sensors[0].pop("wattHours", None)
+        out = io.BytesIO()
+        self.assertEqual(6000, export.write_columnar(sensors, out))
+        out.seek(0)
+        fields, groups = export.read_columnar(out)
+        self.assertEqual(list(export.FIELDS), fields)
+        groups = list(groups)
+        self.assertEqual(2, len(groups))
+        labels = groups[0]["label"] + groups[1]["label"]
+        self.assertEqual([s["label"] for s in sensors], labels)
+        self.assertEqual(sensors[-1]["val"], groups[1]["val"][-1])
+        self.assertTrue(math.isnan(groups[0]["wattHours"][0]))
+
+    def test_columnar_truncated(self):
+        out = io.BytesIO()
+        export.write_columnar(self.sensors, out)
+        _fields, groups = export.read_columnar(io.BytesIO(out.getvalue()[:-20]))
+        with self.assertRaises(ValueError):
+            list(groups)
+
+    def test_select(self):
+        selected = list(export.select(self.sensors, ["Relay Control", "nope"]))
+        self.assertEqual(["Relay Control"], [s["label"] for s in selected])
@@ -0,0 +1,82 @@
+import copy
+import json
+import threading
+import unittest
+import urllib.request
+
+from mficlient import client, exporter, fake, fake_data
+
+
+class TestMetricsRenderer(unittest.TestCase):
+    def setUp(self):
+        self.status = json.loads(fake_data.FAKE_STATUS)
+        self.sensors = json.loads(fake_data.FAKE_SENSORS)
+
+    def test_render(self):
+        renderer = exporter.MetricsRenderer()
+        renderer.update(client.Topology(self.status, self.sensors))
+        text = renderer.render()
+        self.assertIn("# TYPE mfi_energy_watt_hours_total counter\n", text)
+        self.assertIn(
+            'mfi_active_power_watts{label="Water Heater Control",model="Outlet",'
+            'mac="11:22:11:11:11:33",tag="active_pwr",id="567af257b1fcced839e98286"}'
+            " 5.667744\n",
+            text,
+        )
+        self.assertEqual(1, text.count("mfi_active_power_watts{"))
+        self.assertEqual(8, text.count("mfi_sensor_value{"))
+        self.assertTrue(text.endswith("\n"))
+
+    def test_incremental(self):
+        renderer = exporter.MetricsRenderer()
+        self.assertEqual(8, renderer.update(client.Topology(self.status, self.sensors)))
+        first = renderer.render()
+        sensors = copy.deepcopy(self.sensors)
+        sensors[4]["rpt_time"] += 1
+        self.assertEqual(0, renderer.update(client.Topology(self.status, sensors)))
+        self.assertIs(first, renderer.render())
+
+        sensors[4]["active_pwr"] = 100.0
+        self.assertEqual(1, renderer.update(client.Topology(self.status, sensors)))
+        self.assertEqual(9, renderer.rendered)
+        self.assertIn("} 100.0\n", renderer.render())
+
+        self.assertEqual(1, renderer.update(client.Topology(self.status, sensors[:7])))
+        self.assertNotIn("Test Analog", renderer.render())
+
+    def test_relabel(self):
+        renderer = exporter.MetricsRenderer()
+        renderer.update(client.Topology(self.status, self.sensors))
+        sensors = copy.deepcopy(self.sensors)
+        for sensor in sensors:
+            sensor["label"] = "RENAMED " + sensor["label"]
+        self.assertEqual(8, renderer.update(client.Topology(self.status, sensors)))
+        text = renderer.render()
+        self.assertEqual(8, text.count('mfi_sensor_value{label="RENAMED '))
+
+        status = copy.deepcopy(self.status)
+        for device in status:
+            device["mac"] = "00:00:00:00:00:00"
+        self.assertEqual(8, renderer.update(client.Topology(status, sensors)))
+        self.assertNotIn("11:22:11:11:11:33", renderer.render())
+
+    def test_escape(self):
+        sensors = [dict(self.sensors[0], label='a "b"\\c\nd')]
+        renderer = exporter.MetricsRenderer()
+        renderer.update(client.Topology(sensors=sensors))
+        self.assertIn('label="a \\"b\\"\\\\c\\nd"', renderer.render())
+
+
+class TestExporter(unittest.TestCase):
+    def test_serve_metrics(self):
+        exp = exporter.Exporter(fake.FakeMFiClient())
+        httpd = exp.make_server("127.0.0.1:0")
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        url = "http://127.0.0.1:%i/metrics" % httpd.server_address[1]
+        with urllib.request.urlopen(url) as response:  # noqa: S310
+            self.assertEqual(exporter.CONTENT_TYPE, response.headers["Content-Type"])
+            text = response.read().decode()
+        self.assertIn("mfi_output{", text)
+        self.assertIn("mfi_scrape_duration_seconds ", text)
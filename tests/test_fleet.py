@@ -0,0 +1,170 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from mficlient import client, fake, fleet, main
+
+
+def down():
+    raise client.FailedToLogin("Server rejected login")
+
+
+class TestParseFleet(unittest.TestCase):
+    def test_parse(self):
+        entries = fleet.parse_fleet(
+            "lab=https://u:p@10.0.0.2:6443/  # the lab\n"
+            "http://10.0.1.2:6080/, office=http://10.0.2.2\n"
+            "# http://10.0.3.2\n"
+        )
+        self.assertEqual(["lab", "10.0.1.2", "office"], [n for n, _auth in entries])
+        self.assertEqual(("10.0.0.2", 6443, "u", "p", "/", True, {}), entries[0][1])
+
+    @mock.patch.dict("os.environ", {"MFI_RETRIES": "2", "MFI_READ_TIMEOUT": "10"})
+    def test_transport_options(self):
+        entries = fleet.parse_fleet(
+            "lab=http://10.0.0.2/?read_timeout=5 http://10.0.1.2/?compress=off"
+        )
+        self.assertEqual(
+            [
+                ("lab", {"read_timeout": 5.0, "retries": 2}),
+                ("10.0.1.2", {"read_timeout": 10.0, "retries": 2, "compress": False}),
+            ],
+            [(name, auth[-1]) for name, auth in entries],
+        )
+        fleet_ = fleet.FleetClient.from_entries(
+            entries, defaults={"read_timeout": 30, "backoff": 2}, connect_timeout=3
+        )
+        self.assertEqual(
+            {
+                "port": 6080,
+                "use_tls": False,
+                "read_timeout": 5.0,
+                "retries": 2,
+                "backoff": 2,
+                "connect_timeout": 3,
+            },
+            fleet_._factories["lab"].keywords,
+        )
+
+    @mock.patch("os.getenv")
+    def test_from_env(self, mock_getenv):
+        mock_getenv.side_effect = {"MFI_FLEET": "a=http://h1 b=http://h2"}.get
+        self.assertEqual(["a", "b"], [n for n, _auth in fleet.fleet_from_env()])
+
+    def test_split_key(self):
+        names = ["a", "b"]
+        self.assertEqual([("a", "x/y")], fleet.split_key("a/x/y", names))
+        self.assertEqual([("a", "c/x"), ("b", "c/x")], fleet.split_key("c/x", names))
+
+
+class TestFleetClient(unittest.TestCase):
+    def setUp(self):
+        self.synthetic = fake.SyntheticSession(2, 2)
+        self.fleet = fleet.FleetClient(
+            {
+                "a": fake.FakeMFiClient(),
+                "b": lambda: fake.FakeMFiClient(session=self.synthetic),
+                "down": down,
+            }
+        )
+
+    def test_get_devices(self):
+        devices = self.fleet.get_devices()
+        self.assertEqual(["a", "b"], list(devices))
+        self.assertEqual(2, len(devices["b"]))
+        self.assertIsInstance(self.fleet.errors["down"], client.FailedToLogin)
+
+    def test_get_port(self):
+        port = self.fleet.get_port(label="Outlet 1-2")
+        self.assertEqual("Outlet 1-2", port.label)
+        self.assertEqual(
+            "Relay Control", self.fleet.get_port(label="a/Relay Control").label
+        )
+        self.assertIsNone(self.fleet.get_port(label="b/Relay Control"))
+
+    def test_recovers(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                down()
+            return fake.FakeMFiClient()
+
+        fleet_ = fleet.FleetClient({"flaky": flaky})
+        self.assertEqual({}, fleet_.get_raw_status())
+        self.assertIn("flaky", fleet_.errors)
+        self.assertIn("flaky", fleet_.get_raw_status())
+        self.assertEqual({}, fleet_.errors)
+
+    def test_control_ports(self):
+        results = self.fleet.control_ports(
+            {"a/Relay Control": True, "Outlet 0-1": False, "down/x": True, "nope": True}
+        )
+        self.assertTrue(results["a/Relay Control"].ok)
+        self.assertEqual("a/5650b1f29e1141bc88ed29f9", results["a/Relay Control"].ident)
+        self.assertTrue(results["Outlet 0-1"].ok)
+        self.assertEqual(0.0, self.synthetic._sensors[0]["output"])
+        self.assertIsInstance(results["down/x"].error, client.FailedToLogin)
+        self.assertIsInstance(results["nope"].error, client.DeviceNotFound)
+
+
+class TestFleetCommands(unittest.TestCase):
+    def run_app(self, *argv):
+        fleet_ = fleet.FleetClient(
+            {
+                "a": fake.FakeMFiClient(),
+                "b": fake.FakeMFiClient(session=fake.SyntheticSession(2, 2)),
+                "down": down,
+            }
+        )
+        out = io.StringIO()
+        self.stderr = io.StringIO()
+        with (
+            mock.patch("sys.argv", ["mfi", *argv]),
+            mock.patch("mficlient.fleet.load_fleet", return_value=[("x", ())]),
+            mock.patch("mficlient.fleet.fleet_from_env", return_value=[("x", ())]),
+            mock.patch.object(fleet.FleetClient, "from_entries", return_value=fleet_),
+            contextlib.redirect_stdout(out),
+            contextlib.redirect_stderr(self.stderr),
+        ):
+            result = main.Application().main()
+        return result, out.getvalue()
+
+    def test_dump_sensors(self):
+        _result, out = self.run_app("dump_sensors", "--fleet", "fleet.conf")
+        self.assertIn("Controller", out)
+        self.assertRegex(out, r"\ba \|.*Relay Control")
+        self.assertRegex(out, r"\bb \|.*Outlet 1-2")
+        self.assertIn("Controller `down' failed", self.stderr.getvalue())
+
+    def test_sensors_csv(self):
+        _result, out = self.run_app(
+            "sensors_csv",
+            "--fleet",
+            "f",
+            "--device",
+            "b/Outlet 0-1",
+            "--column-headers",
+        )
+        header, row = out.splitlines()
+        self.assertTrue(header.startswith("controller,time,active_pwr"))
+        self.assertTrue(row.startswith("b,"))
+        self.assertIn("Outlet 0-1", row)
+
+    def test_fleet_from_env(self):
+        _result, out = self.run_app("dump_sensors")
+        self.assertRegex(out, r"\bb \|.*Outlet 1-2")
+
+    def test_every_probes_fleet(self):
+        with mock.patch("mficlient.schedule.Scheduler") as scheduler:
+            self.run_app("dump_sensors", "--fleet", "f", "--every", "10")
+        probe = scheduler.return_value.run.call_args.kwargs["probe"]
+        # Both controllers that answer, 8 ports and 4
+        self.assertEqual(12, len(probe()))
+
+    def test_unsupported(self):
+        result, out = self.run_app("get_data", "--fleet", "f")
+        self.assertEqual(1, result)
+        self.assertIn("does not support fleets", out)
@@ -0,0 +1,76 @@
+import math
+import unittest
+from unittest import mock
+
+from mficlient import client, fake, instrument
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantile(self):
+        hist = instrument.Histogram()
+        self.assertEqual(0.0, hist.quantile(0.5))
+        for value in (0.001, 0.002, 0.02, 0.3, 20):
+            hist.add(value)
+        self.assertEqual(5, hist.count)
+        self.assertEqual([2, 0, 1, 0, 0, 0, 1], hist.counts[:7])
+        self.assertEqual(0.005, hist.quantile(0.4))
+        self.assertEqual(0.025, hist.quantile(0.6))
+        self.assertEqual(math.inf, hist.quantile(1))
+        self.assertAlmostEqual(4.0646, hist.mean)
+
+
+class TestClientStats(unittest.TestCase):
+    def test_client_events(self):
+        session = fake.SyntheticSession(5, ports_per_device=2)
+        c = fake.FakeMFiClient(session=session)
+        stats = c.instrument()
+        c.get_devices()
+        c.get_port(label="Outlet 1-1").control(False)
+
+        stat = stats.endpoints["stat/device"]
+        sensors = stats.endpoints["list/sensors"]
+        self.assertEqual(2, stat.latency.count)
+        self.assertEqual(2, sensors.latency.count)
+        self.assertEqual(1, stats.endpoints["cmd/devmgr"].latency.count)
+        self.assertEqual(2 * len(session._encoded["stat"]), stat.bytes)
+        self.assertGreater(stats.phases["decode"], 0)
+        self.assertGreater(stats.phases["build:get_devices"], 0)
+        self.assertGreater(stats.phases["build:get_port"], 0)
+        self.assertGreater(stats.phases["build:topology"], 0)
+        self.assertEqual(0, stats.relogins)
+
+        report = stats.report()
+        self.assertIn("cmd/devmgr", report)
+        stats.reset()
+        self.assertEqual({}, dict(stats.endpoints))
+
+    def test_relogins(self):
+        session = fake.SyntheticSession(1, failure_rate=1)
+        hook = mock.MagicMock()
+        c = fake.FakeMFiClient(session=session, hooks=[hook])
+        stats = c.instrument()
+        self.assertRaises(client.RequestFailed, c.get_raw_status)
+        self.assertEqual(1, stats.relogins)
+        self.assertEqual(2, stats.endpoints["stat/device"].latency.count)
+        hook.assert_any_call("relogin", "_get_stat", 0.0, 0)
+
+    def test_retries(self):
+        stats = instrument.ClientStats()
+        stats("retry", "stat/device", 0.5)
+        self.assertEqual(1, stats.retries)
+        self.assertIn("retries", stats.report())
+
+    def test_no_hooks(self):
+        c = fake.FakeMFiClient()
+        with mock.patch.object(c, "_emit") as emit:
+            c.get_devices()
+        emit.assert_not_called()
+
+
+class TestAsyncStats(unittest.IsolatedAsyncioTestCase):
+    async def test_requests(self):
+        c = fake.FakeAsyncMFiClient()
+        stats = c.instrument()
+        await c.get_devices()
+        self.assertEqual(1, stats.endpoints["stat/device"].latency.count)
+        self.assertGreater(stats.endpoints["list/sensors"].bytes, 0)
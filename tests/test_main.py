@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from mficlient import energy, export, fake, main, recorder
+
+
+class TestApplication(unittest.TestCase):
+    def run_app(self, *argv, client_=None):
+        client_ = client_ or fake.FakeMFiClient()
+        self.stderr = io.StringIO()
+
+        def make_client(*args, hooks=(), **kwargs):
+            client_.hooks.extend(hooks)
+            return client_
+
+        out = io.StringIO()
+        with (
+            mock.patch("sys.argv", ["mfi", *argv]),
+            mock.patch("mficlient.client.get_auth_from_env") as env,
+            mock.patch("mficlient.client.MFiClient", side_effect=make_client),
+            contextlib.redirect_stdout(out),
+            contextlib.redirect_stderr(self.stderr),
+        ):
+            env.return_value = ("host", 6443, "user", "pass", "/", True, {})
+            main.Application().main()
+        return client_, out.getvalue()
+
+    def client_kwargs(self, *argv):
+        calls = []
+
+        def make_client(*args, hooks=(), **kwargs):
+            calls.append(kwargs)
+            return fake.FakeMFiClient(**kwargs)
+
+        with (
+            mock.patch("sys.argv", ["mfi", *argv]),
+            mock.patch("mficlient.client.get_auth_from_env") as env,
+            mock.patch("mficlient.client.MFiClient", side_effect=make_client),
+            mock.patch("mficlient.schedule.Scheduler"),
+            contextlib.redirect_stdout(io.StringIO()),
+        ):
+            env.return_value = ("host", 6443, "user", "pass", "/", True, {})
+            main.Application().main()
+        return calls[0]
+
+    def test_default_read_timeout(self):
+        kwargs = self.client_kwargs("dump_sensors")
+        self.assertNotIn("read_timeout", kwargs)
+        kwargs = self.client_kwargs("dump_sensors", "--every", "5")
+        self.assertEqual(main.DEFAULT_READ_TIMEOUT, kwargs["read_timeout"])
+        kwargs = self.client_kwargs("dump_sensors", "--every", "5", "--timeout", "2")
+        self.assertEqual(2, kwargs["read_timeout"])
+
+    def test_control_device_multiple(self):
+        client_, out = self.run_app(
+            "control_device",
+            "--device",
+            "Relay Control",
+            "--device",
+            "Tiny Relay",
+            "--device",
+            "Nope",
+            "--state",
+            "on",
+        )
+        self.assertEqual(1.0, client_.get_port(label="Relay Control").output)
+        self.assertEqual(1.0, client_.get_port(label="Tiny Relay").output)
+        self.assertIn("Failed to control `Nope'", out)
+
+    def test_dump_sensors(self):
+        _client, out = self.run_app("dump_sensors")
+        self.assertIn("Relay Control", out)
+
+    @mock.patch.dict("os.environ", {"MFI_FLEET": "lab=http://10.0.0.2/"})
+    def test_fleet_env_ignored(self):
+        # Commands without fleet support use $MFI even when $MFI_FLEET is set
+        _client, out = self.run_app("get_data", "--device", "Relay Control")
+        self.assertIn("Relay Control", out)
+
+    def test_watch(self):
+        _client, out = self.run_app("watch", "--device", "Relay Control")
+        self.assertEqual("Relay Control: added\n", out)
+
+    def test_get_history(self):
+        with mock.patch("time.time", return_value=3600.0):
+            _client, out = self.run_app(
+                "get_history", "--device", "Furnace", "--since", "120"
+            )
+        lines = out.splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[1].endswith(",55fc4f0cfb30ddd54d2e3e4f,amps,0.0"))
+
+    def test_get_history_bad_chunk(self):
+        _client, out = self.run_app(
+            "get_history", "--device", "Furnace", "--chunk", "0"
+        )
+        self.assertEqual("--chunk must be positive\n", out)
+
+    def test_record(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sensors.rec")
+            self.run_app("record", "--output", path, "--device", "Furnace")
+            samples = list(recorder.Recorder(path).query())
+        self.assertEqual(1, len(samples))
+        self.assertEqual(3.3274, samples[0].values["val"])
+
+    def test_profile(self):
+        session = fake.SyntheticSession(3)
+        self.run_app(
+            "dump_sensors", "--profile", client_=fake.FakeMFiClient(session=session)
+        )
+        report = self.stderr.getvalue()
+        self.assertIn("stat/device", report)
+        self.assertIn("list/sensors", report)
+        self.assertIn("build:get_devices", report)
+        self.assertIn("decode:json", report)
+
+    def test_every(self):
+        calls = []
+
+        def run(scheduler, task, probe=None, on_error=None, until=None):
+            task()
+            calls.append((scheduler.interval, scheduler.idle_interval, probe()))
+
+        with mock.patch("mficlient.schedule.Scheduler.run", run):
+            _client, out = self.run_app(
+                "dump_sensors", "--every", "5", "--idle-every", "60"
+            )
+        self.assertIn("Relay Control", out)
+        ((interval, idle, sensors),) = calls
+        self.assertEqual((5, 60), (interval, idle))
+        self.assertTrue(sensors)
+
+    def test_export(self):
+        _client, out = self.run_app(
+            "export",
+            "--format",
+            "jsonl",
+            "--device",
+            "Furnace",
+            "--device",
+            "Fisher Temp",
+        )
+        rows = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(["Fisher Temp", "Furnace"], [row["label"] for row in rows])
+
+    def test_energy(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "energy.json")
+            ledger = energy.EnergyLedger(path)
+            ledger.add([{"_id": "p1", "label": "Fan", "energy_sum": 0.0}], now=1000)
+            ledger.add([{"_id": "p1", "label": "Fan", "energy_sum": 1500.0}], now=1060)
+            ledger.save()
+            bucket = ledger._buckets(1000)[1]
+
+            _client, out = self.run_app("energy", "--output", path, "--column-headers")
+        self.assertEqual(
+            ["period,kind,name,kWh", "%s,port,Fan,1.500" % bucket], out.splitlines()
+        )
+
+    def test_energy_period(self):
+        _client, out = self.run_app("energy", "--output", "x", "--period", "week")
+        self.assertEqual("Unknown period `week'\n", out)
+
+    def test_export_columnar(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sensors.col")
+            self.run_app("export", "--format", "columnar", "--output", path)
+            with open(path, "rb") as f:
+                _fields, groups = export.read_columnar(f)
+                (group,) = groups
+        self.assertIn("Relay Control", group["label"])
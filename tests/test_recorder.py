@@ -0,0 +1,73 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mficlient import fake_data, recorder
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "sensors.rec")
+        self.sensors = json.loads(fake_data.FAKE_SENSORS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _poll(self, rec, count, step=60):
+        sensors = copy.deepcopy(self.sensors)
+        for i in range(count):
+            for sensor in sensors:
+                sensor["rpt_time"] = (1000 + i * step) * 1000
+                sensor["val"] = float(i)
+            rec.record(sensors)
+
+    def test_record_and_query(self):
+        rec = recorder.Recorder(self.path)
+        self._poll(rec, 3)
+        samples = list(rec.query(port="Water Heater Control"))
+        self.assertEqual([1000, 1060, 1120], [s.time for s in samples])
+        self.assertEqual("567af257b1fcced839e98286", samples[0].ident)
+        self.assertEqual(2.0, samples[2].values["val"])
+        self.assertEqual(5956.25, samples[0].values["wattHours"])
+        self.assertNotIn("active_pwr", next(rec.query(port="Furnace")).values)
+        self.assertEqual(8, len(list(rec.query(start=1060, end=1120))))
+
+    def test_skips_unchanged_report(self):
+        rec = recorder.Recorder(self.path)
+        self.assertEqual(8, rec.record(self.sensors))
+        self.assertEqual(0, rec.record(self.sensors))
+        record_size = 16 + 8 * len(recorder.RECORD_FIELDS)
+        self.assertEqual(16 + 8 * record_size, os.path.getsize(self.path))
+
+    def test_reopen(self):
+        self._poll(recorder.Recorder(self.path), 2)
+        rec = recorder.Recorder(self.path)
+        self.assertEqual(8, len(rec.ports))
+        self._poll(rec, 1)
+        self.assertEqual(24, len(list(rec.query())))
+        self.assertRaises(ValueError, recorder.Recorder, self.path, fields=("val",))
+
+    def test_downsample(self):
+        rec = recorder.Recorder(self.path)
+        self._poll(rec, 10, step=30)
+        buckets = rec.downsample(120, port="Relay Control")
+        self.assertEqual(
+            [
+                recorder.Bucket(960, "5650b1f29e1141bc88ed29f9", 0.0, 2.0, 1.0, 3),
+                recorder.Bucket(1080, "5650b1f29e1141bc88ed29f9", 3.0, 6.0, 4.5, 4),
+                recorder.Bucket(1200, "5650b1f29e1141bc88ed29f9", 7.0, 9.0, 8.0, 3),
+            ],
+            buckets,
+        )
+
+    def test_abandoned_query(self):
+        rec = recorder.Recorder(self.path)
+        self._poll(rec, 2)
+        query = rec.query()
+        next(query)
+        query.close()
+        self.assertEqual(16, len(list(rec.query())))
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+
+from mficlient import fake, rules
+
+
+def sensor(ident, label, **fields):
+    return {"_id": ident, "label": label, **fields}
+
+
+class TestRule(unittest.TestCase):
+    def test_parse(self):
+        rule = rules.Rule.parse("active_pwr > 1500 for 30s clear 1400 on Heater")
+        self.assertEqual("active_pwr", rule.field)
+        self.assertEqual(">", rule.op)
+        self.assertEqual(1500.0, rule.value)
+        self.assertEqual(30.0, rule.duration)
+        self.assertEqual(1400.0, rule.clear)
+        self.assertEqual("Heater", rule.port)
+        self.assertEqual(
+            "active_pwr > 1500.0 for 30.0s clear 1400.0 on Heater", rule.name
+        )
+
+    def test_parse_changed(self):
+        rule = rules.Rule.parse("output changed on Relay Control")
+        self.assertEqual(rules.CHANGED, rule.op)
+        self.assertEqual("Relay Control", rule.port)
+        self.assertIsNone(rule.value)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            rules.Rule.parse("active_pwr is big")
+        with self.assertRaises(ValueError):
+            rules.Rule("active_pwr", "~", 1)
+        with self.assertRaises(ValueError):
+            rules.Rule("active_pwr", ">")
+
+
+class TestRuleEngine(unittest.TestCase):
+    def test_threshold_duration_and_hysteresis(self):
+        engine = rules.RuleEngine(["active_pwr > 1500 for 30s clear 1400 on Heater"])
+        kinds = []
+        for now, power in [
+            (0, 1000.0),
+            (10, 1600.0),
+            (20, 1450.0),
+            (30, 1600.0),
+            (50, 1600.0),
+            (60, 1600.0),
+            (70, 1450.0),
+            (80, 1300.0),
+        ]:
+            events = engine.update([sensor("h", "Heater", active_pwr=power)], now=now)
+            kinds.append([e.kind for e in events])
+        self.assertEqual(
+            [[], [], [], [], [], [rules.FIRED], [], [rules.CLEARED]], kinds
+        )
+
+    def test_duration_elapses_without_change(self):
+        engine = rules.RuleEngine(["val < 5 for 60s"])
+        reading = [sensor("t", "Freezer", val=3.0)]
+        self.assertEqual([], engine.update(reading, now=0))
+        # The same payload object again, as an incremental client returns
+        (event,) = engine.update(reading, now=60)
+        self.assertEqual(("fired", "t", "Freezer", 3.0), event[:1] + event[2:5])
+        self.assertEqual([(engine.rules[0], "t")], engine.active)
+
+    def test_changed(self):
+        engine = rules.RuleEngine([rules.Rule("output", rules.CHANGED, port="r")])
+        self.assertEqual([], engine.update([sensor("r", "Relay", output=0.0)]))
+        self.assertEqual([], engine.update([sensor("r", "Relay", output=0.0)]))
+        (event,) = engine.update([sensor("r", "Relay", output=1.0)])
+        self.assertEqual((rules.FIRED, 1.0), (event.kind, event.value))
+
+    def test_only_affected_rules(self):
+        engine = rules.RuleEngine(
+            ["active_pwr > 10 on a", "v_rms > 130", "val > 100 on b"]
+        )
+        payload = [
+            sensor("a", "A", active_pwr=20.0, v_rms=120.0),
+            sensor("b", "B", active_pwr=20.0, v_rms=135.0),
+        ]
+        with mock.patch.object(engine, "_check", wraps=engine._check) as check:
+            events = engine.update(payload, now=0)
+            self.assertEqual(3, check.call_count)
+            engine.update([dict(s) for s in payload], now=1)
+            self.assertEqual(3, check.call_count)
+        self.assertEqual(
+            [("active_pwr > 10.0 on a", "a"), ("v_rms > 130.0", "b")],
+            [(e.rule.name, e.ident) for e in events],
+        )
+
+    def test_subscribe_and_poll(self):
+        client = fake.FakeMFiClient()
+        engine = rules.RuleEngine(["output changed on Relay Control"], client=client)
+        callback = engine.subscribe(mock.MagicMock())
+        engine.poll()
+        client.get_port(label="Relay Control").control(True)
+        (event,) = engine.poll()
+        callback.assert_called_once_with(event)
+        self.assertEqual("5650b1f29e1141bc88ed29f9", event.ident)
@@ -0,0 +1,102 @@
+import unittest
+
+from mficlient import schedule
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def wait(self, seconds):
+        self.now += seconds
+
+
+def sensors(**vals):
+    return [
+        {"_id": ident, "val": val, "active_pwr": 0.0} for ident, val in vals.items()
+    ]
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = schedule.Scheduler(
+            10, idle_interval=80, clock=self.clock, wait=self.clock.wait
+        )
+
+    def test_observe(self):
+        self.assertEqual([], self.scheduler.observe(sensors(a=1.0, b=2.0)))
+        self.assertEqual(["b"], self.scheduler.observe(sensors(a=1.0, b=3.0)))
+        self.assertEqual({"b"}, self.scheduler.volatile())
+        self.clock.now += 81
+        self.assertEqual(set(), self.scheduler.volatile())
+
+    def test_idle_ramp(self):
+        delays = []
+        for _ in range(6):
+            self.scheduler.observe(sensors(a=1.0))
+            delays.append(self.scheduler.next_delay())
+        # Nothing can have moved before the second poll
+        self.assertEqual([10, 20, 40, 80, 80, 80], delays)
+        self.scheduler.observe(sensors(a=2.0))
+        self.assertEqual(10, self.scheduler.next_delay())
+
+    def test_no_probe(self):
+        delays = [self.scheduler.next_delay() for _ in range(3)]
+        self.assertEqual([10, 10, 10], delays)
+
+    def test_backoff(self):
+        delays = [self.scheduler.next_delay(failed=True) for _ in range(7)]
+        self.assertEqual([20, 40, 80, 160, 300, 300, 300], delays)
+        self.scheduler.observe(sensors(a=1.0))
+        self.scheduler.observe(sensors(a=2.0))
+        self.assertEqual(10, self.scheduler.next_delay())
+        self.assertEqual(0, self.scheduler.failures)
+
+    def test_slow_controller(self):
+        self.scheduler.observe(sensors(a=1.0))
+        self.scheduler.observe(sensors(a=2.0))
+        self.assertEqual(14, self.scheduler.next_delay(elapsed=7))
+
+    def test_no_drift(self):
+        self.scheduler.observe(sensors(a=1.0))
+        self.scheduler.observe(sensors(a=2.0))
+        self.scheduler.deadline = 1000.0
+        self.clock.now = 1003.0
+        self.assertEqual(1010.0, self.scheduler.schedule(elapsed=3))
+        # A run that overran its slot skips to the next one on the grid
+        self.clock.now = 1035.0
+        self.assertEqual(1040.0, self.scheduler.schedule(elapsed=5))
+
+    def test_run(self):
+        runs = []
+        errors = []
+
+        def task():
+            runs.append(self.clock.now)
+            self.clock.now += 1
+            if len(runs) == 2:
+                raise ValueError("boom")
+            if len(runs) == 3:
+                self.scheduler.stop()
+
+        self.scheduler.run(task, probe=lambda: [], on_error=errors.append)
+        # Backing off after the failure, on the grid despite each run
+        # taking a second
+        self.assertEqual([1000.0, 1010.0, 1030.0], runs)
+        self.assertEqual(["boom"], [str(e) for e in errors])
+
+    def test_run_until(self):
+        runs = []
+        self.scheduler.run(lambda: runs.append(1), until=lambda: True)
+        self.assertEqual([1], runs)
+
+    def test_run_raises(self):
+        def task():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.scheduler.run(task)
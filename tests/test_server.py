@@ -0,0 +1,154 @@
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from mficlient import client, fake, server
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.client = fake.FakeMFiClient()
+        self.daemon = server.Daemon(self.client, interval=60)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _serve(self, address):
+        httpd = self.daemon.make_server(address)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        return httpd
+
+    def _check_local_client(self, local):
+        port = local.get_port(label="Relay Control")
+        self.assertEqual("5650b1f29e1141bc88ed29f9", port.ident)
+        self.assertEqual("Output 12v", port.model)
+        self.assertIsNone(local.get_port(label="Nope"))
+        devices = local.get_devices()
+        self.assertEqual(4, len(devices))
+        self.assertIsInstance(devices[0], client.Device)
+        self.assertEqual(8, len(local.get_raw_sensors()))
+
+        port.control(True)
+        self.assertEqual(1.0, local.get_port(label="Relay Control").output)
+        results = local.control_ports({"Tiny Relay": True, "Nope": True})
+        self.assertTrue(results["Tiny Relay"].ok)
+        self.assertFalse(results["Nope"].ok)
+
+    def test_unix_socket(self):
+        path = os.path.join(self.tmpdir, "mfi.sock")
+        self._serve(path)
+        self._check_local_client(server.LocalClient(path))
+
+    def test_tcp(self):
+        httpd = self._serve("127.0.0.1:0")
+        address = "127.0.0.1:%i" % httpd.server_address[1]
+        self._check_local_client(server.LocalClient(address))
+
+    def test_reads_served_from_snapshot(self):
+        path = os.path.join(self.tmpdir, "mfi.sock")
+        self._serve(path)
+        local = server.LocalClient(path)
+        local.get_devices()
+        local.get_port(label="Relay Control")
+        local.get_raw_status()
+        self.assertEqual(1, self.client.cache.misses["sensors"])
+        self.assertEqual(1, self.client.cache.misses["stat"])
+
+    def test_devices_endpoint(self):
+        httpd = self._serve("127.0.0.1:0")
+        local = server.LocalClient("127.0.0.1:%i" % httpd.server_address[1])
+        devices = local._request("GET", "/devices")
+        ports = {p["label"]: p for d in devices for p in d["ports"]}
+        self.assertEqual(5.667744, ports["Water Heater Control"]["active_pwr"])
+        self.assertRaises(server.DeviceNotFound, local._request, "GET", "/nope")
+
+    def _post(self, port, headers, body=b'{"ports": {"Relay Control": true}}'):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        try:
+            conn.request("POST", "/control", body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def test_browser_requests_refused(self):
+        httpd = self._serve("127.0.0.1:0")
+        port = httpd.server_address[1]
+        json_type = {"Content-Type": "application/json"}
+        # What a web page can send without a preflight
+        status, _ = self._post(port, {"Content-Type": "text/plain"})
+        self.assertEqual(415, status)
+        status, _ = self._post(port, {**json_type, "Origin": "http://evil.example"})
+        self.assertEqual(403, status)
+        status, _ = self._post(port, {**json_type, "Host": "evil.example:6090"})
+        self.assertEqual(403, status)
+        self.assertEqual(0.0, self.client.get_port(label="Relay Control").output)
+        status, result = self._post(port, json_type)
+        self.assertEqual(200, status)
+        self.assertTrue(result["Relay Control"]["ok"])
+
+    def test_control_errors(self):
+        path = os.path.join(self.tmpdir, "mfi.sock")
+        self._serve(path)
+        local = server.LocalClient(path)
+        with self.assertRaises(server.DaemonError):
+            local._request("POST", "/control", {"ports": ["Relay Control"]})
+
+        with mock.patch.object(
+            self.client, "get_stat", side_effect=client.RequestFailed("down")
+        ):
+            with self.assertRaisesRegex(server.DaemonError, "down"):
+                local.control_ports({"Relay Control": True})
+
+        # The command went out even though the refresh after it failed
+        with (
+            mock.patch.object(
+                self.client, "get_topology", side_effect=client.RequestFailed("down")
+            ),
+            self.assertLogs("mficlient.server", "WARNING"),
+        ):
+            results = local.control_ports({"Relay Control": True})
+        self.assertTrue(results["Relay Control"].ok)
+        self.assertEqual("down", local.health()["error"])
+
+    def test_health(self):
+        path = os.path.join(self.tmpdir, "mfi.sock")
+        self._serve(path)
+        local = server.LocalClient(path)
+        self.assertEqual({"polled_at": None, "error": None}, local.health())
+        local.get_raw_sensors()
+        self.assertIsNotNone(local.health()["polled_at"])
+
+    def test_poll_failures_logged(self):
+        polled_at = self.daemon.refresh() and self.daemon.polled_at
+        self.daemon.interval = 0
+
+        def fail():
+            self.daemon.stop()
+            raise client.RequestFailed("down")
+
+        with (
+            mock.patch.object(self.client, "get_topology", side_effect=fail),
+            self.assertLogs("mficlient.server", "WARNING") as logs,
+        ):
+            self.daemon.poll()
+        self.assertIn("down", logs.output[0])
+        self.assertEqual(
+            {"polled_at": polled_at, "error": "down"}, self.daemon.health()
+        )
+
+    def test_default_address(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.tmpdir}):
+            address = server.default_address()
+        self.assertEqual(os.path.join(self.tmpdir, "mficlient.sock"), address)
+        self._serve(address)
+        self.assertEqual(0o600, os.stat(address).st_mode & 0o777)
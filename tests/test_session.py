@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mficlient import client, session
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmpdir, "cache")
+        self.cache = session.SessionCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_load(self):
+        self.assertIsNone(self.cache.load("https://host:6443", "user"))
+        self.cache.save("https://host:6443", "user", {"JSESSIONID": "abc"})
+        self.assertEqual(
+            {"JSESSIONID": "abc"}, self.cache.load("https://host:6443", "user")
+        )
+        self.assertIsNone(self.cache.load("https://host:6443", "other"))
+        self.assertEqual(0o700, os.stat(self.directory).st_mode & 0o777)
+        (path,) = os.listdir(self.directory)
+        path = os.path.join(self.directory, path)
+        self.assertEqual(0o600, os.stat(path).st_mode & 0o777)
+
+        os.chmod(path, 0o644)
+        self.assertIsNone(self.cache.load("https://host:6443", "user"))
+
+        self.cache.clear("https://host:6443", "user")
+        self.cache.clear("https://host:6443", "user")
+        self.assertEqual([], os.listdir(self.directory))
+
+    @mock.patch("requests.Session")
+    def test_client_reuses_session(self, mock_session):
+        self.cache.save("https://host:6443", "user", {"JSESSIONID": "abc"})
+        with mock.patch.object(client.MFiClient, "_login") as login:
+            client.MFiClient("host", "user", "pass", session_cache=self.cache)
+            login.assert_not_called()
+        mock_session.return_value.cookies.update.assert_called_once_with(
+            {"JSESSIONID": "abc"}
+        )
+
+    @mock.patch("requests.Session")
+    def test_client_logs_in_without_cache(self, mock_session):
+        session_ = mock_session.return_value
+        session_.post.return_value.status_code = 200
+        session_.post.return_value.url = "/manage"
+        with mock.patch("requests.utils.dict_from_cookiejar") as cookies:
+            cookies.return_value = {"JSESSIONID": "new"}
+            client.MFiClient("host", "user", "pass", session_cache=self.cache)
+        self.assertEqual(
+            {"JSESSIONID": "new"}, self.cache.load("https://host:6443", "user")
+        )
+
+    @mock.patch("requests.Session")
+    def test_stale_session_falls_back_to_login(self, mock_session):
+        self.cache.save("https://host:6443", "user", {"JSESSIONID": "old"})
+        c = client.MFiClient("host", "user", "pass", session_cache=self.cache)
+        session_ = mock_session.return_value
+        stale = mock.MagicMock(status_code=200)
+        stale.json.side_effect = ValueError("login page")
+        fresh = mock.MagicMock(status_code=200)
+        fresh.json.return_value = {"data": "foo"}
+        session_.get.side_effect = [stale, mock.MagicMock(), fresh]
+        session_.post.return_value.status_code = 200
+        session_.post.return_value.url = "/manage"
+        with mock.patch("requests.utils.dict_from_cookiejar") as cookies:
+            cookies.return_value = {"JSESSIONID": "new"}
+            self.assertEqual("foo", c._get_stat())
+        self.assertEqual(
+            {"JSESSIONID": "new"}, self.cache.load("https://host:6443", "user")
+        )
+
+    @mock.patch("requests.Session")
+    def test_rejected_login_clears_cache(self, mock_session):
+        self.cache.save("https://host:6443", "user", {"JSESSIONID": "old"})
+        c = client.MFiClient("host", "user", "pass", session_cache=self.cache)
+        mock_session.return_value.post.return_value.status_code = 401
+        self.assertRaises(client.FailedToLogin, c._login)
+        self.assertIsNone(self.cache.load("https://host:6443", "user"))
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import mficlient
+from mficlient import bench
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(mficlient.__file__)))
+
+MODULES = """
+import sys
+from mficlient import main
+try:
+    main.Application().main()
+except (SystemExit, Exception):
+    pass
+sys.stdout.write(" ".join(sorted(sys.modules)))
+"""
+
+# Never needed to show help or to fetch and print one payload
+HEAVY = ("asyncio", "http.server", "mficlient.aio", "mficlient.server")
+
+
+def imported(*argv):
+    env = dict(os.environ, MFI="http://127.0.0.1:1/", PYTHONPATH=SRC)
+    result = subprocess.run(
+        [sys.executable, "-c", MODULES, *argv],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return set(result.stdout.splitlines()[-1].split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_help_imports(self):
+        modules = imported("--help")
+        for name in ("requests", "mficlient.client", "json", *HEAVY):
+            self.assertNotIn(name, modules)
+
+    def test_raw_status_imports(self):
+        modules = imported("raw_status")
+        self.assertIn("mficlient.client", modules)
+        for name in ("pprint", *HEAVY):
+            self.assertNotIn(name, modules)
+
+    # Wall-clock timing is too noisy on a loaded machine to run by default
+    @unittest.skipUnless(
+        os.environ.get("MFI_TIMING_TESTS"), "set MFI_TIMING_TESTS=1 to run"
+    )
+    def test_help_budget(self):
+        python = bench.startup("python", [], rounds=3, code="pass").best
+        mfi = bench.startup("--help", ["--help"], rounds=3).best
+        # Parsing arguments should cost little over the interpreter itself
+        self.assertLess(mfi, python + 0.15)
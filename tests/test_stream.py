@@ -0,0 +1,70 @@
+import json
+import unittest
+
+from mficlient import client, fake, stream
+
+
+def chunked(body, size):
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+class TestIterJsonArray(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        data = [{"a": 1, "b": [1, 2, {"c": "ü"}]}, {"a": 2.5}, 123456]
+        body = json.dumps({"meta": {"rc": "ok"}, "data": data}).encode()
+        for size in (1, 2, 3, 7, len(body)):
+            self.assertEqual(data, list(stream.iter_json_array(chunked(body, size))))
+
+    def test_fields(self):
+        body = [b'{"data": [{"a": 1, "b": 2}, {"b": 3}]}']
+        self.assertEqual(
+            [{"a": 1}, {}], list(stream.iter_json_array(body, fields=("a", "z")))
+        )
+
+    def test_empty(self):
+        self.assertEqual([], list(stream.iter_json_array([b'{"data": []}'])))
+
+    def test_invalid(self):
+        for body in (b"<html>", b'{"meta": {}}', b"{}", b'{"data": [1, 2'):
+            with self.assertRaises(ValueError):
+                list(stream.iter_json_array([body]))
+
+
+class TestStreamingClient(unittest.TestCase):
+    def setUp(self):
+        self.session = fake.SyntheticSession(20, 3)
+
+    def test_matches_buffered(self):
+        buffered = fake.FakeMFiClient(session=self.session)
+        streamed = fake.FakeMFiClient(session=self.session, stream=True)
+        self.assertEqual(buffered.get_raw_status(), streamed.get_raw_status())
+        self.assertEqual(buffered.get_raw_sensors(), streamed.get_raw_sensors())
+
+    def test_stat_fields(self):
+        client_ = fake.FakeMFiClient(
+            session=self.session, stream=True, stat_fields=client.STAT_FIELDS
+        )
+        stat = client_.get_raw_status()
+        self.assertEqual(20, len(stat))
+        self.assertNotIn("radio_table", stat[0])
+        self.assertEqual(self.session._status[0]["port_cfg"], stat[0]["port_cfg"])
+        devices = client_.get_devices()
+        self.assertEqual(3, len(devices[0].ports))
+
+    def test_iter_devices(self):
+        client_ = fake.FakeMFiClient(session=self.session)
+        devices = client_.iter_devices()
+        first = next(devices)
+        self.assertEqual(self.session._status[0]["_id"], first.ident)
+        self.assertEqual(19, len(list(devices)))
+
+    def test_login_page_fails(self):
+        class Session(fake.FakeSession):
+            def get(self, url, **kwargs):
+                return fake.EncodedResponse(200, b"<html>")
+
+        client_ = fake.FakeMFiClient(session=Session(), stream=True)
+        with self.assertRaises(client.RequestFailed):
+            client_.get_raw_status()
+        with self.assertRaises(client.RequestFailed):
+            list(client_.iter_devices())
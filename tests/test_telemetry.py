@@ -0,0 +1,53 @@
+import json
+import math
+import unittest
+
+from mficlient import client, fake, fake_data, telemetry
+
+
+class TestTelemetryStore(unittest.TestCase):
+    def setUp(self):
+        self.sensors = json.loads(fake_data.FAKE_SENSORS)
+
+    def test_columns(self):
+        store = telemetry.TelemetryStore().load(self.sensors)
+        self.assertEqual(len(self.sensors), len(store))
+        row = store.row("567af257b1fcced839e98286")
+        self.assertEqual(5.667744, store.column("active_pwr")[row])
+        self.assertEqual("Outlet", store.column("model")[row])
+        self.assertTrue(math.isnan(store.column("active_pwr")[0]))
+        self.assertRaises(client.DeviceNotFound, store.row, "nope")
+
+    def test_update_existing(self):
+        store = telemetry.TelemetryStore().load(self.sensors)
+        store.update({"_id": "567af257b1fcced839e98286", "active_pwr": 7})
+        self.assertEqual(len(self.sensors), len(store))
+        row = store.row("567af257b1fcced839e98286")
+        self.assertEqual(7.0, store.get(row, "active_pwr"))
+
+    def test_port_view(self):
+        store = telemetry.TelemetryStore().load(self.sensors)
+        port = store.port(fake.FakeMFiClient(), "567af257b1fcced839e98286")
+        self.assertEqual("Water Heater Control", port.label)
+        self.assertEqual("active_pwr", port.tag)
+        self.assertEqual(5.667744, port.value)
+        self.assertEqual(1.0, port.output)
+        self.assertNotIn("map_id", port.data)
+        port.refresh({"active_pwr": 1.5})
+        self.assertEqual(1.5, port.value)
+
+    def test_keep_raw(self):
+        store = telemetry.TelemetryStore(keep_raw=True).load(self.sensors)
+        port = store.port(None, "567af257b1fcced839e98286")
+        self.assertEqual("560005309e11c18115baf2a5", port.data["map_id"])
+        self.assertEqual(set(self.sensors[4]), set(port.data))
+        port.data["map_id"] = "other"
+        self.assertEqual("560005309e11c18115baf2a5", self.sensors[4]["map_id"])
+        del port.data["map_id"]
+        self.assertNotIn("map_id", port.data)
+
+    def test_slots(self):
+        port = client.Port(None, "ident")
+        self.assertRaises(AttributeError, setattr, port, "foo", 1)
+        device = client.Device(None, "ident")
+        self.assertRaises(AttributeError, setattr, device, "foo", 1)
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from mficlient import transport
+
+
+class TestTransport(unittest.TestCase):
+    def test_defaults(self):
+        t = transport.Transport()
+        self.assertEqual({}, t.request_kwargs())
+        session = t.session()
+        self.assertEqual("keep-alive", session.headers["Connection"])
+        self.assertNotEqual("identity", session.headers["Accept-Encoding"])
+
+    def test_session(self):
+        t = transport.Transport(pool_size=4, keep_alive=False, compress=False)
+        session = t.session()
+        adapter = session.get_adapter("https://host:6443/")
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertEqual("close", session.headers["Connection"])
+        self.assertEqual("identity", session.headers["Accept-Encoding"])
+
+    def test_timeouts(self):
+        t = transport.Transport(connect_timeout=3, read_timeout=30)
+        self.assertEqual({"timeout": (3, 30)}, t.request_kwargs())
+
+    def test_retries(self):
+        sleep = mock.MagicMock()
+        t = transport.Transport(retries=3, backoff=1, sleep=sleep)
+        ok = mock.MagicMock(status_code=200)
+        send = mock.MagicMock(
+            side_effect=[
+                requests.ConnectionError(),
+                mock.MagicMock(status_code=503),
+                ok,
+            ]
+        )
+        on_retry = mock.MagicMock()
+        self.assertIs(ok, t.call(send, on_retry))
+        self.assertEqual([mock.call(1), mock.call(2)], sleep.call_args_list)
+        self.assertEqual(2, on_retry.call_count)
+
+    def test_retries_exhausted(self):
+        t = transport.Transport(retries=1, sleep=mock.MagicMock())
+        send = mock.MagicMock(side_effect=requests.Timeout())
+        self.assertRaises(requests.Timeout, t.call, send)
+        self.assertEqual(2, send.call_count)
+        failed = mock.MagicMock(status_code=502)
+        self.assertIs(failed, t.call(lambda: failed))
+
+    def test_no_retries(self):
+        t = transport.Transport()
+        send = mock.MagicMock(side_effect=requests.ConnectionError())
+        self.assertRaises(requests.ConnectionError, t.call, send)
+        self.assertEqual(1, send.call_count)
+
+    def test_parse_options(self):
+        self.assertEqual(
+            {"read_timeout": 30.0, "retries": 2, "keep_alive": False},
+            transport.parse_options(
+                {
+                    "read_timeout": "30",
+                    "retries": "2",
+                    "keep_alive": "no",
+                    "pool_size": None,
+                }
+            ),
+        )
+        with self.assertRaises(ValueError):
+            transport.parse_options({"retries": "many"})